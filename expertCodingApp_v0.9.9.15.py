@@ -3,45 +3,1011 @@ import os
 import sys
 import time
 
+startupSteps = [('start', time.time())] #(step, time it was done) up to the first window, for the startup report
+
 import numpy as np
-import matplotlib as mpl
 
-if sys.platform == 'darwin':
-    mpl.use('macosx')
+startupSteps.append(('numpy', time.time()))
 
-import matplotlib.pyplot as plt
-import matplotlib.widgets as mpl_w
-import matplotlib.gridspec as gridspec
+#matplotlib (with its GUI backend) and h5py are slow to import and the batch modes don't need them, so they're
+#imported when first needed: pyplot by loadPyplot() and h5py when an .hdf5 file is read
+plt = None
+gridspec = None
 
+import atexit
 import csv
-import h5py
+import errno
+import functools
+import hashlib
+import json
+import socket
+import threading
+import zlib
 from datetime import datetime
 import time
 
+clock = time.perf_counter if hasattr(time, 'perf_counter') else time.clock #for click timing; time.clock is gone from Python 3.8 on
+
 global VERSION_NUMBER
 VERSION_NUMBER = "0.9.9.15"
 
-class EyeDataPlot:
-    def __init__(self, filepath, coder, targetList=[], targetDuration=1.000, timeAfterTarget=0.125, fixationWindowSec = 0.250):
-        self.readData(filepath)
+def loadPyplot(): #imports pyplot the first time a figure is needed, after picking the backend
+    global plt, gridspec
+    if plt is None:
+        import matplotlib as mpl
+
+        if sys.platform == 'darwin':
+            mpl.use('macosx')
+        mpl.rcParams['toolbar'] = 'None'  # Disable toolbar on matplotlib windows
+
+        import matplotlib.pyplot as plt
+        import matplotlib.gridspec as gridspec
+        startupSteps.append(('matplotlib', time.time()))
+    return plt
+
+def reportStartup(): #prints how long each step took before the first window, once
+    global startupSteps
+    if startupSteps is None: return
+
+    steps = []
+    for ((_, previous), (step, done)) in zip(startupSteps, startupSteps[1:]):
+        steps.append("{} {:.2f}s".format(step, done - previous))
+    print("Startup: {}; first window after {:.2f}s".format(', '.join(steps), time.time() - startupSteps[0][1]))
+    startupSteps = None
+
+CACHE_VERSION = 2 #bump whenever the layout of the cached arrays changes
+CACHE_FOLDER = '.cache' #created next to the data files
+CACHE_SIZE_LIMIT = 2*1024**3 #bytes; least recently used recordings are evicted beyond this
+HDF5_CHUNK_ROWS = 2**18 #tracker samples read at a time from .hdf5 files
+
+IVT_VELOCITY_THRESHOLD = 30. #deg/sec; slower samples may be part of a fixation
+IDT_DISPERSION_THRESHOLD = 1.0 #deg; (max-min of x) + (max-min of y) of a fixation's samples
+MIN_FIXATION_SEC = 0.100 #sec; shorter runs aren't proposed as fixations
+PREFETCH_COUNT = 2 #upcoming files in dataFileList.txt that are parsed into the cache while the current one is coded
+OUTPUT_SYNC_INTERVAL = 2.0 #sec; coded rows are written to disk this often (and on exit)
+JOURNAL_SUFFIX = '.journal' #added to the .csv name for the journal it's written through
+LOCK_SUFFIX = '.lock' #added to the journal name while a program is writing it
+JOURNAL_STALE_AFTER = 60. #sec; a lock that hasn't been touched for this long was left behind by a crash
+SELECTIONS_SUFFIX = '.selections' #added to the .csv name for the binary log of the selections behind its rows
+COMPENDIUM_DB = 'compendium.sqlite' #every coded .csv, kept up to date by run3
+SYNTHETIC_DURATION = 104. #sec; about as long as the eyefollower recordings (49 targets and the first one again, ~2s each)
+BENCHMARK_RATES = [60., 500., 2000.] #Hz of the synthetic recordings the benchmark runs on
+BENCHMARK_REPEATS = 3 #each stage's time is the best of this many runs
+BENCHMARK_TOLERANCE = 1.5 #a stage that takes more than this times its baseline time (or peak memory) is reported
+BENCHMARK_BASELINE = 'benchmarks.json' #stage times, peak memory and result digests from an earlier --benchmark run
+PROFILE_LOG = 'profile.jsonl' #--profile appends a line per coded file to this, in the folder of the output .csv
+PROFILE_BINS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000] #upper edges of the event latency histograms; slower events go in one more bin
+
+def mapHeader(header): #maps each header string to its column number, keeping the first one if a name is repeated
+    columns = {}
+    for k, name in enumerate(header):
+        columns.setdefault(name, k)
+    return columns
+
+class SampleLookup: #binary-search lookups in a sorted column (time, '# count'), clamped to the ends of the recording
+    def __init__(self, column):
+        self.column = column
+        self.last = len(column)-1
+
+    def position(self, value): #position of value in the column (its first occurrence), or of the next larger value
+        return min(int(np.searchsorted(self.column, value, side='left')), self.last)
+
+    def bounds(self, startValue, endValue): #(beg, end): the sample just before startValue and the last one up to endValue
+        beg = min(max(int(np.searchsorted(self.column, startValue, side='left'))-1, 0), max(self.last, 0))
+        end = int(np.searchsorted(self.column, endValue, side='right'))
+        return beg, end
+
+    def only(self, value, tolerance): #position of the one sample within tolerance of value, or None if there are none or several
+        beg = int(np.searchsorted(self.column, value - tolerance, side='left'))
+        end = int(np.searchsorted(self.column, value + tolerance, side='right'))
+        return beg if end - beg == 1 else None
+
+def firstAbove(values, threshold, lo, isSorted): #first position at or after lo where values > threshold, or len(values)
+    if isSorted:
+        return max(lo, int(np.searchsorted(values, threshold, side='right')))
+
+    hits = np.flatnonzero(values[lo:] > threshold)
+    return lo + int(hits[0]) if len(hits) else len(values)
+
+def buildSegmentIndex(rowIndex, skip): #maps each ROW_INDEX value to the positions (first, last) just before and just after its target
+    #A target starts at the first sample with its ROW_INDEX, except for the target the recording starts on, which starts
+    #at its first sample from position skip on (the start of the recording isn't used). It ends where ROW_INDEX next changes.
+    n = len(rowIndex)
+    runStarts = np.concatenate(([0], np.flatnonzero(rowIndex[1:] != rowIndex[:-1]) + 1)) if n else np.zeros(0, dtype=int)
+    runEnds = np.append(runStarts[1:], n)
+
+    segments = {}
+    initial = rowIndex[0] if n else None
+    for value, start, end in zip(rowIndex[runStarts].tolist(), runStarts.tolist(), runEnds.tolist()):
+        if value == initial:
+            if value in segments or end <= skip: continue
+            start = max(start, skip)
+        segments.setdefault(value, (start-1, end))
+
+    return segments
+
+class TargetGrid: #where the target was over the recording: one run per change of posx/posy, found with numpy in one pass
+    #As in buildSegmentIndex, the target the recording starts on starts at position skip, since the start isn't used.
+    def __init__(self, posx, posy, time, skip=0):
+        n = len(posx)
+        changes = np.flatnonzero((posx[1:] != posx[:-1]) | (posy[1:] != posy[:-1])) + 1 #a nan never equals itself, so it's a run of its own
+        self.first = np.concatenate(([0], changes)) if n else np.zeros(0, dtype=int) #position of each run's first sample
+        if n > skip and (len(self.first) == 1 or self.first[1] > skip):
+            self.first[0] = skip
+        self.last = np.append(self.first[1:]-1, n-1) if n else np.zeros(0, dtype=int) #and of its last one
+        self.x = posx[self.first] #target location of each run
+        self.y = posy[self.first]
+        self.onset = time[self.first] #when each run starts
+
+        self.locations = np.unique(np.column_stack((self.x, self.y)), axis=0) #every distinct target location once
+        self.limits = [np.min(self.x)*1.5, np.max(self.x)*1.5, np.min(self.y)*1.5, np.max(self.y)*1.5] if n else [] #XY plot limits
+
+    def at(self, position): #the run that the sample at position belongs to
+        return int(np.searchsorted(self.first, position, side='right')) - 1
+
+class TrialJoiner: #pairs tracker samples with their trials from the stimulus table, one chunk of samples at a time
+    #Tracker samples are dropped until one is logged after the first TRIAL_START. From then on every sample belongs to
+    #the current trial, and the trial advances by one at each sample logged after the current TRIAL_END. Reading stops
+    #at the end of the stimulus table or at the first 'SP' block after the first trial.
+    def __init__(self, stimulus):
+        self.starts = stimulus['TRIAL_START']
+        self.ends = stimulus['TRIAL_END']
+
+        self.stop = len(stimulus) #trial number at which reading stops
+        blocks = np.flatnonzero(stimulus['BLOCK'][1:] == b'SP')
+        if len(blocks):
+            self.stop = int(blocks[0]) + 1
+
+        self.trial = -1 #current trial; -1 until the first sample after TRIAL_START
+        self.done = False #True once a sample has passed the last trial
+
+    def feed(self, loggedTime): #returns the first and last+1 positions to keep in this chunk, and the trial of each kept sample
+        n = len(loggedTime)
+        isSorted = bool(np.all(loggedTime[1:] >= loggedTime[:-1])) #logged times normally only increase; if not, fall back to scanning
+
+        if self.done:
+            return n, n, np.zeros(0, dtype=int)
+
+        if self.trial < 0:
+            start = firstAbove(loggedTime, self.starts[0], 0, isSorted)
+            if start == n:
+                return n, n, np.zeros(0, dtype=int)
+            self.trial = 0
+            searchFrom = start+1 #the sample that starts a trial isn't compared with that trial's end
+        else:
+            start = 0
+            searchFrom = 0
+
+        bounds = [start] #bounds[k] is where trials[k] starts in this chunk
+        trials = [self.trial]
+        while True:
+            nextStart = firstAbove(loggedTime, self.ends[self.trial], searchFrom, isSorted)
+            if nextStart == n: break #current trial carries on into the next chunk
+
+            self.trial += 1
+            if self.trial >= self.stop:
+                self.done = True
+                break
+
+            bounds.append(nextStart)
+            trials.append(self.trial)
+            searchFrom = nextStart+1
+
+        bounds.append(nextStart)
+        return start, nextStart, np.repeat(trials, np.diff(bounds))
+
+class RecordingCache: #sidecar binary copy of a parsed recording, so each data file only has to be parsed once
+    def __init__(self, filepath, sizeLimit=CACHE_SIZE_LIMIT):
+        self.filepath = filepath
+        self.folder = os.path.join(os.path.dirname(filepath), CACHE_FOLDER)
+        self.stem = os.path.join(self.folder, os.path.basename(filepath)) #entry files are <stem>.json, <stem>.data.npy, ...
+        self.sizeLimit = sizeLimit
+
+    def entryFiles(self, stem):
+        return [stem+'.json', stem+'.data.npy']
+
+    def contentHash(self, sampleBytes=1 << 16): #hash of the start and end of the file, as a check on top of its size and mtime
+        #Hashing all of it would read the whole recording again on every load, which is what the cache is there to avoid.
+        #The samples catch a file replaced by another of the same size with its mtime kept (as some copy tools do).
+        digest = hashlib.sha1()
+        with open(self.filepath, 'rb') as file:
+            digest.update(file.read(sampleBytes))
+            file.seek(max(os.fstat(file.fileno()).st_size - sampleBytes, 0))
+            digest.update(file.read(sampleBytes))
+        return digest.hexdigest()
+
+    def load(self, interests): #returns (interests, data, metadata) or None if there is no current entry
+        try:
+            with open(self.stem+'.json') as file:
+                info = json.load(file)
+        except (IOError, OSError, ValueError):
+            return None
+
+        source = os.stat(self.filepath)
+        if info['version'] != CACHE_VERSION or info['requested'] != interests or \
+           info['size'] != source.st_size or info['mtime'] != source.st_mtime or \
+           info['hash'] != self.contentHash(): #the source file changed (or the cache layout did), so this entry is stale
+            self.remove(self.stem)
+            return None
+
+        try:
+            dataArray = np.load(self.stem+'.data.npy', mmap_mode='r') #one row per interest
+        except (IOError, OSError, ValueError):
+            self.remove(self.stem)
+            return None
+
+        os.utime(self.stem+'.json', None) #mark as recently used, for eviction
+        
+        metadata = info['metadata']
+        metadata['resolution'] = tuple(metadata['resolution'])
+
+        return (info['interests'],
+                dict(zip(info['interests'], dataArray)),
+                metadata)
+
+    def save(self, interests, requested, data, metadata):
+        source = os.stat(self.filepath)
+        info = {'version': CACHE_VERSION,
+                'source': os.path.basename(self.filepath),
+                'size': source.st_size,
+                'mtime': source.st_mtime,
+                'hash': self.contentHash(),
+                'requested': requested,
+                'interests': interests,
+                'metadata': metadata}
+
+        if not os.path.isdir(self.folder):
+            os.makedirs(self.folder)
+
+        #write to temporary files and rename, so a half-written entry is never picked up; the .json goes last
+        try:
+            with open(self.stem+'.data.npy.tmp', 'wb') as file:
+                np.save(file, np.array([data[i] for i in interests]))
+            sidecar = json.dumps(info) #before touching the entry, so metadata that can't be written leaves nothing behind
+            os.replace(self.stem+'.data.npy.tmp', self.stem+'.data.npy')
+
+            with open(self.stem+'.json.tmp', 'w') as file:
+                file.write(sidecar)
+            os.replace(self.stem+'.json.tmp', self.stem+'.json')
+        except Exception:
+            self.remove(self.stem, temporary=True) #no .json, so evict() would never find these files again
+            raise
+
+        self.evict()
+
+    def remove(self, stem, temporary=False):
+        for name in self.entryFiles(stem) + ([name+'.tmp' for name in self.entryFiles(stem)] if temporary else []):
+            try:
+                os.remove(name)
+            except OSError: #already gone (another process evicted it), or still mapped by the program on Windows
+                pass
+
+    def evict(self): #drop least recently used entries until the folder is under its size limit
+        entries = []
+        for name in os.listdir(self.folder):
+            if name[-5:] == '.json':
+                stem = os.path.join(self.folder, name[:-5])
+                try:
+                    files = list(filter(os.path.isfile, self.entryFiles(stem)))
+                    entries.append([os.path.getmtime(stem+'.json'), sum(map(os.path.getsize, files)), stem])
+                except OSError: #removed by another process (the prefetch pool) in the meantime
+                    continue
+
+        entries.sort()
+        total = sum(size for lastUsed, size, stem in entries)
+        for lastUsed, size, stem in entries:
+            if total <= self.sizeLimit: break
+            if stem == self.stem: continue #always keep the recording that was just cached
+            self.remove(stem)
+            total -= size
+
+###profiling###
+#Opt-in with --profile. The functions that matter when coding are wrapped by profiled(...), which only looks at the clock
+#while there is a profiler, so normal runs don't pay for it.
+
+profiler = None #the Profiler while --profile is on
+
+class Profiler: #time spent in each stage and latency histograms of mouse events, logged as a JSON line per coded file
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.stages = {} #stage -> [calls, seconds]
+        self.events = {} #event kind -> [count, seconds, slowest, counts per bin of PROFILE_BINS_MS]
+
+    def record(self, kind, name, seconds):
+        if kind == 'stage':
+            entry = self.stages.setdefault(name, [0, 0.])
+            entry[0] += 1
+            entry[1] += seconds
+        else:
+            entry = self.events.setdefault(name, [0, 0., 0., [0]*(len(PROFILE_BINS_MS)+1)])
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+            entry[3][np.searchsorted(PROFILE_BINS_MS, seconds*1000.)] += 1
+
+    def peakMemoryMB(self): #largest resident size of this process so far, or None where it can't be read (Windows)
+        try:
+            import resource
+        except ImportError:
+            return None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024.**2 if sys.platform == 'darwin' else peak / 1024. #bytes on Macs, kilobytes elsewhere
+
+    def write(self, plot): #appends what was recorded since the last write to the log next to plot's .csv, then starts over
+        import platform
+
+        entry = {'day/time': datetime.now().strftime('%Y-%m-%d_%H-%M-%S'),
+                 'host': platform.node(),
+                 'platform': sys.platform,
+                 'version': VERSION_NUMBER,
+                 'filepath': plot.filepath,
+                 'coder': plot.coder,
+                 'csv': os.path.basename(plot.csvFileName),
+                 'samples': getattr(plot, 'dataN', None),
+                 'stages': dict((name, {'calls': calls, 'seconds': round(seconds, 6)}) for name, (calls, seconds) in self.stages.items()),
+                 'events': dict((name, {'count': count, 'mean ms': round(1000.*seconds/count, 3), 'max ms': round(1000.*slowest, 3),
+                                        'bins ms': PROFILE_BINS_MS, 'histogram': histogram})
+                                for name, (count, seconds, slowest, histogram) in self.events.items()),
+                 'peak MB': self.peakMemoryMB()}
+
+        logPath = os.path.join(os.path.dirname(plot.csvFileName), PROFILE_LOG)
+        try:
+            with open(logPath, 'a') as log:
+                log.write(json.dumps(entry, sort_keys=True) + '\n')
+        except (IOError, OSError) as error:
+            print("Could not write the profile to {}: {}".format(logPath, error))
+        self.reset()
+
+def profiled(name, kind='stage'): #decorator that adds the time of each call to the profiler as a stage or an event kind
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if profiler is None:
+                return function(*args, **kwargs)
+            start = time.time()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                profiler.record(kind, name, time.time() - start)
+        return wrapper
+    return decorate
+
+###signal processing###
+#These work on whole arrays of valid (nan-free) samples. Eye arrays may have one row per eye, so every eye is done in one pass.
+
+def pythagoreanError(eyeX, eyeY, targX, targY): #Pythagorean distance between eye position and target position, per sample
+    return np.sqrt( (eyeX - targX)**2 + (eyeY - targY)**2 )
+
+def undirectedVelocity(eyeX, eyeY, eyeTime): #speed between successive samples, so there is one fewer value than samples
+    distance = np.sqrt( np.diff(eyeX)**2 + np.diff(eyeY)**2 ) #Pythagorean distance between successive eye positions
+    timediff = np.diff(eyeTime) #delta time
+
+    moving = timediff > 0 #sometimes a time stamp gets duplicated for some reason
+    return np.where(moving, distance / np.where(moving, timediff, 1.), 0.) #v = d/t, or 0 for a duplicated time stamp
+
+def undirectedAcceleration(velocity, eyeTime): #change in velocity between successive velocity values (taken at the midpoints of their samples)
+    midpoints = (eyeTime[1:] + eyeTime[:-1]) / 2.
+    timediff = np.diff(midpoints)
+
+    moving = timediff > 0
+    return np.where(moving, np.diff(velocity) / np.where(moving, timediff, 1.), 0.)
+
+@profiled('deriveSignals')
+def deriveSignals(data, valid, eyes, acceleration=False): #per-sample error, velocity (and acceleration) of each eye over the valid rows
+    if len(eyes) == 0: return {}
+
+    eyeTime = data['time'][valid]
+    eyeX = np.array([data[eye+'_x'][valid] for eye in eyes]) #one row per eye
+    eyeY = np.array([data[eye+'_y'][valid] for eye in eyes])
+
+    P = pythagoreanError(eyeX, eyeY, data['posx'][valid], data['posy'][valid])
+    V = undirectedVelocity(eyeX, eyeY, eyeTime)
+    A = undirectedAcceleration(V, eyeTime) if acceleration else None
+
+    signals = {}
+    for k, eye in enumerate(eyes):
+        signals[eye] = {'pyth_err': P[k], 'velocity': V[k]}
+        if acceleration:
+            signals[eye]['acceleration'] = A[k]
+    return signals
+
+def minMaxLevels(x, y, minBins): #min/max pyramid of y against sorted x: bins of 2, 4, 8... samples, down to minBins bins or fewer
+    #levels[k-1] holds the bins of 2**k samples: their first x, and the min and max y (nans only where a whole bin is nan)
+    levels = []
+    (x, low, high) = (np.asarray(x, dtype=float), np.asarray(y, dtype=float), np.asarray(y, dtype=float))
+    while len(x) > minBins:
+        if len(x) % 2: #repeat the last bin so the pairs line up
+            (x, low, high) = (np.append(x, x[-1]), np.append(low, low[-1]), np.append(high, high[-1]))
+        (x, low, high) = (x[::2], np.fmin(low[::2], low[1::2]), np.fmax(high[::2], high[1::2]))
+        levels.append((x, low, high))
+    return levels
+
+###statistics###
+
+def roundedMode(X): #most common value once rounded to 0.1 (the smallest one if there's a tie; the minimum if all differ)
+    if len(X) == 0: return float("nan")
+
+    #np.round works on X*10, so it can disagree with Python's round() right at the halfway points; redo those with round()
+    rounded = np.round(X, 1)
+    halfway = np.abs(X*10 - np.floor(X*10) - 0.5) < 1e-6
+    rounded[halfway] = [round(x, 1) for x in X[halfway].tolist()]
+
+    rounded = np.sort(rounded, kind='stable')
+    runStarts = np.concatenate(([0], np.flatnonzero(np.diff(rounded) != 0) + 1))
+    runLengths = np.diff(np.append(runStarts, len(rounded)))
+
+    longest = np.argmax(runLengths)
+    if runLengths[longest] == 1:
+        return rounded[0]
+    return rounded[runStarts[longest] + runLengths[longest] - 2]
+
+def statisticsBlock(rangeX, rangeY, windowX, windowY, targetX, targetY):
+    #returns a 2x5x6 array of statistics: [range, window] x [X, XErr, Y, YErr, PythErr] x [mean, median, mode, stdDev, min, max]
+    #nans are ignored, and a statistic of an empty list is nan (as is the stdDev of a single value)
+    rows = []
+    for (X, Y) in [(rangeX, rangeY), (windowX, windowY)]:
+        X = X[~np.isnan(X)]
+        Y = Y[~np.isnan(Y)]
+        n = min(len(X), len(Y)) #x and y are cleaned separately, so pair them up like zip does
+        P = np.sqrt( (X[:n]-targetX)**2 + (Y[:n]-targetY)**2 )
+        rows += [X, X-targetX, Y, Y-targetY, P[~np.isnan(P)]]
+
+    #one row per list, padded with nans; the leading column of zeros makes the running sums start at 0 like sum() does
+    counts = np.array([len(row) for row in rows])
+    block = np.full((len(rows), counts.max()+1), np.nan)
+    block[:, 0] = 0.
+    for k, row in enumerate(rows):
+        block[k, 1:counts[k]+1] = row
+    valid = ~np.isnan(block)
+    valid[:, 0] = False
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        #cumsum adds in order, as sum() did before Python 3.12; from 3.12 sum() compensates for rounding, so the two can
+        #differ in the last bits (well below the 3 decimals that are written out, though a value right on a rounding edge can flip)
+        means = np.nancumsum(block, axis=1)[:, -1] / counts
+        deviations = np.where(valid, (block - means[:, None])**2, 0.)
+        deviations[:, 0] = 0.
+        stdDevs = np.sqrt( np.cumsum(deviations, axis=1)[:, -1] / counts )
+
+    stdDevs[counts <= 1] = float("nan")
+    #take the first extreme element, as min() and max() do, so even the sign of a zero matches
+    rowIndex = np.arange(len(rows))
+    mins = block[rowIndex, np.argmin(np.where(valid, block, np.inf), axis=1)]
+    maxs = block[rowIndex, np.argmax(np.where(valid, block, -np.inf), axis=1)]
+    mins[counts == 0] = maxs[counts == 0] = float("nan")
+
+    medians = [np.median(row) if len(row) else float("nan") for row in rows]
+    modes = [roundedMode(row) for row in rows]
+
+    return np.column_stack((means, medians, modes, stdDevs, mins, maxs)).reshape(2, 5, 6)
+
+###fixation detection###
+#Proposals for the coder: I-VT keeps the samples that are slow, I-DT the ones in a short window that stays in one place,
+#and a fixation is a long enough run of samples that both agree on. These work on the valid (nan-free) samples.
+
+def velocityFixations(velocity, threshold=IVT_VELOCITY_THRESHOLD): #I-VT: samples whose speed to and from their neighbours is under threshold
+    slow = velocity < threshold #velocity[k] is between samples k and k+1
+    mask = np.ones(len(velocity)+1, dtype=bool)
+    mask[:-1] &= slow
+    mask[1:] &= slow
+    return mask
+
+def dispersionFixations(eyeX, eyeY, windowN, threshold=IDT_DISPERSION_THRESHOLD): #I-DT: samples in any windowN samples whose dispersion is under threshold
+    n = len(eyeX)
+    if windowN < 1 or n < windowN: return np.zeros(n, dtype=bool)
+
+    dispersion = np.zeros(n-windowN+1)
+    for Z in (eyeX, eyeY):
+        Z = np.ascontiguousarray(Z)
+        windows = np.lib.stride_tricks.as_strided(Z, shape=(n-windowN+1, windowN), strides=(Z.strides[0], Z.strides[0])) #a view, not a copy
+        dispersion += windows.max(axis=1) - windows.min(axis=1)
+
+    starts = (dispersion <= threshold).astype(int) #each window that passes covers its windowN samples
+    cover = np.zeros(n+1, dtype=int)
+    cover[:n-windowN+1] += starts
+    cover[windowN:] -= starts
+    return np.cumsum(cover[:n]) > 0
+
+def fixationRuns(mask, minLength): #(starts, ends) of the runs of True in mask that are at least minLength long, ends included
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1) - 1
+    keep = ends - starts + 1 >= minLength
+    return starts[keep], ends[keep]
+
+def proposeCodings(segments, validPositions, runs, error, windowLength): #maps each ROW_INDEX value to (aS, aE, wS, wE) positions
+    #aS to aE is the longest fixation inside the target's segment, and the window (windowLength samples, as when coding by hand)
+    #is the part of it with the smallest mean error. Targets without a fixation that fits a window get no proposal.
+    runStarts = validPositions[runs[0]] #runs are in valid samples, segments in positions
+    runEnds = validPositions[runs[1]]
+    cumError = np.concatenate(([0.], np.cumsum(error)))
+
+    proposals = {}
+    for rowIndex, (before, after) in segments.items():
+        (first, last) = (before+1, after-1) #the segment's own samples; before and after belong to the neighbouring targets
+        lo = int(np.searchsorted(runEnds, first, side='left')) #runs ending before the segment can't overlap it
+        hi = int(np.searchsorted(runStarts, last, side='right'))
+        if hi <= lo: continue
+
+        starts = np.maximum(runStarts[lo:hi], first)
+        ends = np.minimum(runEnds[lo:hi], last)
+        k = int(np.argmax(ends - starts))
+        (aS, aE) = int(starts[k]), int(ends[k])
+        if aE - aS < windowLength: continue
+
+        #window starts go from aS to aE-windowLength; each one's mean error is over the valid samples it covers
+        i = np.arange(np.searchsorted(validPositions, aS, side='left'), np.searchsorted(validPositions, aE-windowLength, side='right'))
+        if len(i) == 0: continue
+        j = np.searchsorted(validPositions, validPositions[i]+windowLength, side='right')
+        meanError = (cumError[j] - cumError[i]) / (j - i)
+
+        wS = int(validPositions[i[np.argmin(meanError)]])
+        proposals[rowIndex] = (aS, aE, wS, int(round(wS + windowLength)))
+
+    return proposals
+
+###coded output files###
+
+def statisticColumns(): #names of the statistics columns, in the order statisticsBlock(...).ravel() gives them
+    return [span+moment+kind for span in ['r_','w_'] \
+                             for kind in ['X','XErr','Y','YErr','PythErr'] \
+                             for moment in ['mean','median','mode','stdDev','min','max']]
+
+def codedHeader(): #column names of a coded .csv (its second row)
+    return ['Coded by', 'Filename', 'EyeLeftRight', 'Target#', 'targetX', 'targetY', 'Onset (sec)',
+            'Range start (sec)', 'range start delay', 'range start quality', 'Range end (sec)', 'range end delay', 'range end quality', 'range duration', 'range nonan count x', 'range nonan count y',
+            'Window start (sec)', 'window start delay', 'Window end (sec)', 'window end delay', 'window quality', 'window duration', 'window nonan count x', 'window nonan count y'] \
+           + statisticColumns()
+
+def readCodedFile(csvPath): #returns (info, header, rows) of a coded .csv, where info maps 'filepath', 'coder', ... to their values
+    with open(csvPath, 'r') as file:
+        reader = csv.reader(file)
+        infoRow = next(reader, [])
+        header = next(reader, [])
+        rows = [row for row in reader if len(row) >= len(header) > 0] #skips blank lines (and a partly written last row)
+
+    info = {}
+    for item in infoRow: #e.g. 'coder: LTB' or 'frequency (Hz): 500.00'
+        key, _, value = item.partition(': ')
+        info[key] = value
+
+    if 'filepath' not in info or len(header) == 0:
+        raise ValueError("{} is not a coded data file".format(csvPath))
+    return info, header, rows
+
+def writeCodedFile(csvPath, rows): #writes a whole .csv at once, so there's never a half-written one
+    with open(csvPath+'.tmp', 'w') as file:
+        csv.writer(file, delimiter=',', lineterminator='\n').writerows(rows)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(csvPath+'.tmp', csvPath)
+
+def readJournal(journalPath): #the rows of a journal, up to its first damaged line (the one being written during a crash)
+    rows = []
+    with open(journalPath, 'r') as file:
+        for line in file:
+            checksum, _, record = line.rstrip('\n').partition(' ')
+            try:
+                if not line.endswith('\n') or int(checksum, 16) != zlib.crc32(record.encode('utf-8')) & 0xffffffff:
+                    break
+                rows.append(json.loads(record))
+            except ValueError:
+                break
+    return rows
+
+def processRunning(pid): #whether a process with this pid is running on this computer
+    if os.name == 'nt': #os.kill(pid, 0) would send it a Ctrl+C on Windows
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid) #PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle: return False
+        exitCode = ctypes.c_ulong()
+        kernel32.GetExitCodeProcess(handle, ctypes.byref(exitCode))
+        kernel32.CloseHandle(handle)
+        return exitCode.value == 259 #STILL_ACTIVE
+    try:
+        os.kill(pid, 0)
+    except OSError as error:
+        return error.errno == errno.EPERM #it's there, but belongs to another user
+    return True
+
+def journalWriter(journalPath): #'<computer> <pid>' of the program writing the journal (maybe on another computer sharing the folder), or None
+    try:
+        touched = os.path.getmtime(journalPath+LOCK_SUFFIX) #the writer touches its lock every sync
+        with open(journalPath+LOCK_SUFFIX) as lock:
+            writer = lock.read().strip()
+    except (IOError, OSError): #no lock: the writer crashed before it made one, or it was written by an older version
+        return None
+
+    (host, pid) = (writer.rsplit(' ', 1) + [''])[:2]
+    if host == socket.gethostname() and pid.isdigit(): #on this computer, so there's no need to wait for the lock to go stale
+        return writer if processRunning(int(pid)) else None
+    return writer if time.time() - touched < JOURNAL_STALE_AFTER else None
+
+def recoverJournals(folder): #turns journals left behind by a crash into .csv files
+    for name in sorted(os.listdir(folder)):
+        if name[-len(JOURNAL_SUFFIX):] == JOURNAL_SUFFIX:
+            journalPath = os.path.join(folder, name)
+            csvPath = journalPath[:-len(JOURNAL_SUFFIX)]
+            writer = journalWriter(journalPath)
+            if writer is not None:
+                print("Skipping {}, which is still being coded (by {})".format(csvPath, writer))
+                continue
+            rows = readJournal(journalPath)
+            writeCodedFile(csvPath, rows)
+            os.remove(journalPath)
+            try:
+                os.remove(journalPath+LOCK_SUFFIX)
+            except OSError:
+                pass
+            print("Recovered {} ({} rows)".format(csvPath, max(len(rows)-2, 0)))
+
+def latestCodedFile(filepath, coder): #the newest <file>_<coder>_<date>.csv made from a data file, or None
+    prefix = os.path.basename(filepath)[:-4] + '_' + coder + '_'
+    folder = os.path.dirname(filepath) or '.'
+    if not os.path.isdir(folder): return None
+
+    names = [n for n in os.listdir(folder) if n[:len(prefix)] == prefix and n[-4:] == '.csv' and len(n) == len(prefix)+20]
+    return os.path.join(folder, max(names)) if names else None #the date sorts as text
+
+def partialCodedFile(filepath, coder): #the newest coded .csv of a data file if it has fewer rows than targets to code, else None
+    csvPath = latestCodedFile(filepath, coder)
+    if csvPath is None: return None
+    try:
+        info, header, rows = readCodedFile(csvPath)
+        return csvPath if len(rows) < int(info['number']) else None
+    except (IOError, OSError, ValueError, KeyError, csv.Error):
+        return None
+
+class CodedFileWriter: #writes a coded .csv through an append-only journal, so the interface never waits on the disk
+    #Rows are queued in memory; a background thread appends them to <csv>.journal and fsyncs every syncInterval seconds.
+    #Each journal line is a JSON row with a CRC in front. close() (also run at exit) writes the .csv from the journal
+    #and removes it; after a crash, recoverJournals does the same with what made it to disk. The <journal>.lock next to
+    #it is touched every syncInterval, so recoverJournals leaves journals alone while they're being written.
+    def __init__(self, csvFileName, syncInterval=OUTPUT_SYNC_INTERVAL):
+        self.csvFileName = csvFileName
+        self.journalName = csvFileName + JOURNAL_SUFFIX
+        self.lockName = self.journalName + LOCK_SUFFIX
+        self.syncInterval = syncInterval
+        self.pending = [] #journal lines not written yet
+        self.pendingLock = threading.Lock()
+        self.syncLock = threading.Lock()
+
+        #a journal that is already there holds rows that aren't in the .csv yet, which a new journal would either lose or
+        #(appended to) write twice, so it has to be recovered first
+        if os.path.exists(self.journalName):
+            writer = journalWriter(self.journalName)
+            if writer is not None:
+                raise IOError("{} is already being coded (by {})".format(csvFileName, writer))
+            raise IOError("{} was left behind by a crash; start the program again to recover it".format(self.journalName))
+
+        with open(self.lockName, 'w') as lock: #before the journal, so it's never there without its lock
+            lock.write("{} {}\n".format(socket.gethostname(), os.getpid()))
+        self.journal = open(self.journalName, 'w')
+        self.closed = False
+
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self.syncLoop)
+        self.thread.daemon = True
+        self.thread.start()
+        atexit.register(self.close) #for the SystemExit paths and anything else that ends the program
+
+    def writerow(self, row):
+        record = json.dumps([str(item) for item in row])
+        line = "{:08x} {}\n".format(zlib.crc32(record.encode('utf-8')) & 0xffffffff, record)
+        with self.pendingLock:
+            self.pending.append(line)
+
+    def sync(self): #appends the queued rows to the journal and makes sure they're on disk
+        with self.syncLock:
+            with self.pendingLock:
+                lines, self.pending = self.pending, []
+            if len(lines) == 0: return
+
+            try:
+                self.journal.write(''.join(lines))
+                self.journal.flush()
+                os.fsync(self.journal.fileno())
+            except (IOError, OSError) as error: #e.g. the network drive went away; try again next time
+                print("Could not write to {}: {}".format(self.journalName, error))
+                with self.pendingLock:
+                    self.pending = lines + self.pending
+
+    def syncLoop(self):
+        while not self.stopping.wait(self.syncInterval):
+            self.sync()
+            try:
+                os.utime(self.lockName, None) #still being written
+            except OSError as error:
+                print("Could not touch {}: {}".format(self.lockName, error))
+
+    def close(self):
+        if self.closed: return
+        self.closed = True
+
+        self.stopping.set()
+        self.thread.join()
+        self.sync()
+        self.journal.close()
+
+        writeCodedFile(self.csvFileName, readJournal(self.journalName))
+        os.remove(self.journalName)
+        os.remove(self.lockName)
+
+SELECTION_FIELDS = [('eye', 'S10'), ('target', '<i4'), ('aS', '<i8'), ('aE', '<i8'), ('wS', '<i8'), ('wE', '<i8'),
+                    ('aS_quality', '<f8'), ('aE_quality', '<f8'), ('wSE_quality', '<f8')]
+
+class SelectionLog: #every selection committed in a coding session, as records of one structured array that grows by doubling
+    #Positions are kept whole, where the .csv only has times to 3 decimals. dump appends the records to a file in one
+    #write, so the sessions of a resumed .csv follow each other; np.fromfile(path, dtype=SELECTION_FIELDS) reads them back.
+    def __init__(self, capacity=128):
+        self.records = np.zeros(capacity, dtype=SELECTION_FIELDS)
+        self.count = 0
+
+    def append(self, eye, target, selection):
+        if self.count == len(self.records):
+            self.records = np.concatenate((self.records, np.zeros(len(self.records), dtype=self.records.dtype)))
+        self.records[self.count] = (eye, target, selection.aS, selection.aE, selection.wS, selection.wE,
+                                    selection.aS_quality, selection.aE_quality, selection.wSE_quality)
+        self.count += 1
+
+    def rows(self):
+        return self.records[:self.count]
+
+    def dump(self, path):
+        if self.count == 0: return
+        try:
+            with open(path, 'ab') as file:
+                self.rows().tofile(file)
+        except (IOError, OSError) as error:
+            print("Could not write {}: {}".format(path, error))
+
+def readSelectionLog(path): #the records dumped to a .selections file, or None if there isn't one
+    if not os.path.isfile(path): return None
+    return np.fromfile(path, dtype=SELECTION_FIELDS)
+
+class Compendium: #all coded .csv files in an SQLite database, brought up to date incrementally
+    #Only new or changed files are read in. For each data file and coder, the .csv with the latest date in its name is
+    #the current one and supersedes the older ones, which are kept but left out of currentRows and export.
+    def __init__(self, dbPath=COMPENDIUM_DB):
+        import sqlite3
+        self.db = sqlite3.connect(dbPath)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS sources (path TEXT PRIMARY KEY, file TEXT, coder TEXT, stamp TEXT,
+                                                size INTEGER, mtime REAL, info TEXT, header TEXT);
+            CREATE INDEX IF NOT EXISTS sourcesByFile ON sources (file, coder, stamp);
+            CREATE TABLE IF NOT EXISTS codedRows (path TEXT, rowNumber INTEGER, eye TEXT, target TEXT, data TEXT,
+                                                  PRIMARY KEY (path, rowNumber));
+            CREATE INDEX IF NOT EXISTS rowsByTarget ON codedRows (eye, target);
+            CREATE VIEW IF NOT EXISTS currentSources AS
+                SELECT * FROM sources s WHERE stamp = (SELECT MAX(stamp) FROM sources t WHERE t.file = s.file AND t.coder = s.coder);
+            """)
+
+    def ingest(self, folder): #reads in the coded files of folder that are new or changed, and forgets the ones that are gone
+        seen = set()
+        with self.db: #one transaction
+            for name in sorted(os.listdir(folder)):
+                if name[-4:] != '.csv' or len(name) < 21 or name[-21] != '_': #only coded files (not copies)
+                    continue
+                path = os.path.join(folder, name)
+                seen.add(path)
+
+                source = os.stat(path)
+                known = self.db.execute('SELECT size, mtime FROM sources WHERE path = ?', (path,)).fetchone()
+                if known is not None and tuple(known) == (source.st_size, source.st_mtime):
+                    continue
+
+                try:
+                    info, header, rows = readCodedFile(path)
+                    columns = mapHeader(header)
+                    keys = [(row[columns['EyeLeftRight']], row[columns['Target#']]) for row in rows]
+                except (IOError, OSError, ValueError, KeyError, csv.Error) as error:
+                    print("Skipping {}: {}".format(path, error))
+                    continue
+
+                self.db.execute('DELETE FROM codedRows WHERE path = ?', (path,))
+                self.db.execute('INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                                (path, os.path.basename(info['filepath']), info.get('coder', ''), name[-20:-4],
+                                 source.st_size, source.st_mtime, json.dumps(info), json.dumps(header)))
+                self.db.executemany('INSERT INTO codedRows VALUES (?, ?, ?, ?, ?)',
+                                    [(path, k, eye, target, json.dumps(row)) for k, ((eye, target), row) in enumerate(zip(keys, rows))])
+
+            for (path,) in self.db.execute('SELECT path FROM sources').fetchall():
+                if os.path.dirname(path) == folder and path not in seen: #deleted since the last time
+                    self.db.execute('DELETE FROM codedRows WHERE path = ?', (path,))
+                    self.db.execute('DELETE FROM sources WHERE path = ?', (path,))
+
+    def currentRows(self, file=None): #(file, coder, eye, target, row) of every current coded row; row maps header strings to values
+        query = 'SELECT s.file, s.coder, s.header, r.eye, r.target, r.data FROM currentSources s JOIN codedRows r ON r.path = s.path'
+        arguments = ()
+        if file is not None:
+            query += ' WHERE s.file = ?'
+            arguments = (file,)
+
+        for (file, coder, header, eye, target, data) in self.db.execute(query + ' ORDER BY s.file, s.coder, r.rowNumber', arguments):
+            yield file, coder, eye, target, dict(zip(json.loads(header), json.loads(data)))
+
+    def export(self, csvPath): #the current files one after the other, newest first, each with its header block and a blank line
+        out = []
+        for (path, info, header) in self.db.execute('SELECT path, info, header FROM currentSources ORDER BY stamp DESC, path').fetchall():
+            out.append([key+': '+value for key, value in json.loads(info).items()])
+            out.append(json.loads(header))
+            out += [json.loads(data) for (data,) in self.db.execute('SELECT data FROM codedRows WHERE path = ? ORDER BY rowNumber', (path,))]
+            out.append([])
+        writeCodedFile(csvPath, out)
+
+    def close(self):
+        self.db.close()
+
+###inter-coder agreement###
+#Codings of the same target (Filename, EyeLeftRight, Target#) by different coders are compared in pairs, all at once.
+#The measures are the delays from the target onset: the absolute times mostly vary with when the target was shown, so their
+#ICC is about 1 whatever the coders did.
+
+AGREEMENT_MEASURES = ['range start delay', 'range end delay', 'window start delay', 'window end delay']
+
+def codingPairs(keys, coders): #(i, j) of every two codings with the same key by different coders; keys must be sorted
+    first, second = [], []
+    for d in range(1, len(keys)):
+        i = np.flatnonzero(keys[:-d] == keys[d:]) #codings d apart in the same group
+        if len(i) == 0: break #groups are contiguous, so no group is more than d long
+        i = i[coders[i] != coders[i+d]]
+        first.append(i)
+        second.append(i+d)
+    if len(first) == 0: return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+    return np.concatenate(first), np.concatenate(second)
+
+def intervalIoU(start1, end1, start2, end2): #overlap of two intervals over their union, per element (nan if either is missing)
+    overlap = np.maximum(np.minimum(end1, end2) - np.maximum(start1, start2), 0.)
+    union = np.maximum(end1, end2) - np.minimum(start1, start2)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        iou = np.where(union > 0, overlap/union, np.where(start1 == start2, 1., 0.)) #two identical points agree fully
+    iou[np.isnan(start1) | np.isnan(end1) | np.isnan(start2) | np.isnan(end2)] = float("nan")
+    return iou
+
+def iccConsistency(groups, x, y): #ICC(3,1), consistency of two raters, for each group of (x, y) pairs; nan pairs are left out
+    keep = ~(np.isnan(x) | np.isnan(y))
+    (groups, x, y) = (groups[keep], x[keep], y[keep])
+    m = int(groups.max())+1 if len(groups) else 0
+    total = lambda W: np.bincount(groups, weights=W, minlength=m)
+
+    n = np.bincount(groups, minlength=m).astype(float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        grand = total(x+y) / (2*n)
+        rowMean = (x+y)/2
+        xMean = total(x)/n
+        yMean = total(y)/n
+        ssRows = 2*total( (rowMean - grand[groups])**2 )
+        ssRaters = n*((xMean - grand)**2 + (yMean - grand)**2)
+        ssTotal = total( (x - grand[groups])**2 + (y - grand[groups])**2 )
+        msRows = ssRows / (n-1)
+        msError = (ssTotal - ssRows - ssRaters) / (n-1)
+        return (msRows - msError) / (msRows + msError), n
+
+def agreement(codings): #per-target, per-pair and per-coder summaries of a list of (file, coder, eye, target, row) codings
+    #returns three lists of rows, each starting with its header
+    codings.sort(key=lambda c: (c[0], c[2], c[3], c[1]))
+    keyList = [(c[0], c[2], c[3]) for c in codings]
+    keyNames = sorted(set(keyList))
+    keyIndex = dict((key, k) for k, key in enumerate(keyNames))
+    coderNames = sorted(set(c[1] for c in codings))
+    coderIndex = dict((coder, k) for k, coder in enumerate(coderNames))
+
+    keys = np.array([keyIndex[key] for key in keyList], dtype=int)
+    coders = np.array([coderIndex[c[1]] for c in codings], dtype=int)
+    number = lambda value: float(value) if value not in ('', None) else float("nan")
+    values = np.array([[number(c[4].get(name)) for name in AGREEMENT_MEASURES] for c in codings]).reshape(-1, len(AGREEMENT_MEASURES))
+
+    (i, j) = codingPairs(keys, coders)
+    differences = np.abs(values[i] - values[j]) #one column per measure
+    rangeIoU = intervalIoU(values[i, 0], values[i, 1], values[j, 0], values[j, 1])
+    windowIoU = intervalIoU(values[i, 2], values[i, 3], values[j, 2], values[j, 3])
+    pairMetrics = np.column_stack((differences, rangeIoU, windowIoU))
+    metricNames = ['|d| '+name for name in AGREEMENT_MEASURES] + ['range IoU', 'window IoU']
+
+    def means(groups, size, metrics): #nan-ignoring mean of each metric column per group, and the number of pairs in each group
+        with np.errstate(invalid='ignore', divide='ignore'):
+            counted = ~np.isnan(metrics)
+            sums = np.array([np.bincount(groups, weights=np.where(counted[:, k], metrics[:, k], 0.), minlength=size) for k in range(metrics.shape[1])]).T
+            ns = np.array([np.bincount(groups, weights=counted[:, k], minlength=size) for k in range(metrics.shape[1])]).T
+            return sums/ns, np.bincount(groups, minlength=size)
+
+    fmt = lambda X: ["{:.3f}".format(x) for x in X]
+
+    #per target: how far apart the coders were on it
+    targetMeans, targetPairs = means(keys[i], len(keyNames), pairMetrics)
+    codersPerKey = np.bincount(keys, minlength=len(keyNames))
+    targetRows = [['Filename', 'EyeLeftRight', 'Target#', 'coders', 'pairs'] + metricNames]
+    for k in np.flatnonzero(targetPairs):
+        targetRows.append(list(keyNames[k]) + [int(codersPerKey[k]), int(targetPairs[k])] + fmt(targetMeans[k]))
+
+    #per pair of coders: the same, plus the ICC of each measure over the targets they both coded
+    (a, b) = (np.minimum(coders[i], coders[j]), np.maximum(coders[i], coders[j]))
+    pairIds = a*len(coderNames) + b
+    pairNames, pairGroups = np.unique(pairIds, return_inverse=True)
+    pairGroups = pairGroups.ravel()
+    flip = coders[i] > coders[j] #so x is always the first coder of the pair
+    x = np.where(flip[:, None], values[j], values[i])
+    y = np.where(flip[:, None], values[i], values[j])
+    iccs = np.column_stack([iccConsistency(pairGroups, x[:, k], y[:, k])[0] for k in range(len(AGREEMENT_MEASURES))]) \
+           if len(pairNames) else np.zeros((0, len(AGREEMENT_MEASURES)))
+    iccNames = ['ICC '+name for name in AGREEMENT_MEASURES]
+
+    pairMeans, pairCounts = means(pairGroups, len(pairNames), pairMetrics)
+    pairRows = [['coder 1', 'coder 2', 'targets'] + metricNames + iccNames]
+    for k, pairId in enumerate(pairNames):
+        pairRows.append([coderNames[pairId // len(coderNames)], coderNames[pairId % len(coderNames)], int(pairCounts[k])] + fmt(pairMeans[k]) + fmt(iccs[k]))
+
+    #per coder: over every pair the coder is in
+    both = np.concatenate((coders[i], coders[j]))
+    coderMeans, coderPairs = means(both, len(coderNames), np.vstack((pairMetrics, pairMetrics)))
+    pairOf = np.concatenate((pairNames // len(coderNames), pairNames % len(coderNames)))
+    with np.errstate(invalid='ignore'):
+        coderIccs = [np.nanmean(np.vstack((iccs, iccs))[pairOf == c], axis=0) if np.any(pairOf == c) else np.full(len(AGREEMENT_MEASURES), np.nan)
+                     for c in range(len(coderNames))]
+    coderRows = [['coder', 'targets coded', 'pairs'] + metricNames + ['mean '+name for name in iccNames]]
+    for c, coder in enumerate(coderNames):
+        coderRows.append([coder, int(np.count_nonzero(coders == c)), int(coderPairs[c])] + fmt(coderMeans[c]) + fmt(coderIccs[c]))
+
+    return targetRows, pairRows, coderRows
+
+class NonanView: #the rows of data that have no nan in any interest, taken through a validity mask when asked for
+    def __init__(self, data, valid):
+        self.data = data
+        self.valid = valid
+        self.derived = {} #series that only exist for the valid rows, like pyth_err and velocity
+
+    def __getitem__(self, key):
+        if key in self.derived:
+            return self.derived[key]
+        return self.data[key][self.valid]
+
+    def __setitem__(self, key, value):
+        self.derived[key] = value
+
+    def __contains__(self, key):
+        return key in self.derived or key in self.data
+
+    def keys(self):
+        return list(self.data.keys()) + list(self.derived.keys())
 
+class EyeDataPlot:
+    def __init__(self, filepath, coder, targetList=[], targetDuration=1.000, timeAfterTarget=0.125, fixationWindowSec = 0.250, useCache=True, proposeFixations=True, resumeFrom=None):
         self.interests = ['time', '# count', \
                  'left_gaze_x','left_gaze_y', \
                  'right_gaze_x','right_gaze_y', \
                  'posx', 'posy', \
                  'ROW_INDEX']
 
+        self.cache = RecordingCache(filepath) if useCache else None
+        if not self.loadCache():
+            self.readData(filepath)
+        if startupSteps is not None:
+            startupSteps.append(('data', time.time()))
+
         self.coder = coder  # Identifier for person doing coding
         self.targetDuration  = targetDuration  # sec
         self.timeAfterTarget = timeAfterTarget  # sec
         self.moveToNextTarget = False
         self.targetNumber = 0
         self.fixationWindowSec = fixationWindowSec
+        self.proposeFixations = proposeFixations #start the cursor at a detected fixation for each target
         self.filepath = filepath
 
         self.fileName = filepath.split('/')[-1]#; print(self.fileName)
         self.csvFileName = filepath[:-4] + '_' + coder + \
                            datetime.now().strftime('_%Y-%m-%d_%H-%M') + '.csv' # Output filename
+
+        self.resumeFrom = resumeFrom #a partly coded .csv of this file to carry on with
+        self.codedTargets = {} #eye -> the targets (as written in the .csv) that already have a row
+        if resumeFrom is not None:
+            self.csvFileName = resumeFrom
+            (self.resumedInfo, self.resumedHeader, self.resumedRows) = readCodedFile(resumeFrom)
+            columns = mapHeader(self.resumedHeader)
+            for row in self.resumedRows:
+                self.codedTargets.setdefault(row[columns['EyeLeftRight']], set()).add(row[columns['Target#']])
         
         self.firstPass = True  # So we can initialize the plots
 
@@ -56,95 +1022,166 @@ class EyeDataPlot:
         self.XYplotLimits = [-30., 30., -100., 100.]  # Initialize to nonsense values ...
         readyForClick = False
 
-    def readData(self, filepath):
-        self.table = []
-
+    @profiled('readData')
+    def readData(self, filepath, chunkRows=HDF5_CHUNK_ROWS):
         ###opening the file and reading in the data###
+        #only the columns named in self.interests are parsed, straight into float arrays
+        #self.columns maps each of those interests to its array; self.headerIndex maps every header string to its column number
 
         if filepath[-4:] == '.dat' or filepath[-4:] == '.txt': #for now, .txt assumed to be tab-delimited
-            file = open(filepath)
-            lines = file.read().split('\n')
-            file.close()
-            for line in lines:
-                self.table.append( line.split('\t') ) #.dat is assumed to be tab-delimited
-            self.table.pop()
+            with open(filepath) as file:
+                self.header = file.readline().rstrip('\r\n').split('\t') #.dat is assumed to be tab-delimited
+                firstRow = file.readline().rstrip('\r\n').split('\t')
+
+            self.headerIndex = mapHeader(self.header)
+            self.interests = list(filter(lambda i: i in self.headerIndex, self.interests)) #filter out interests that aren't in the table
+
+            table = np.loadtxt(filepath, delimiter='\t', skiprows=1, ndmin=2,
+                               usecols=[self.headerIndex[i] for i in self.interests])
+            table = np.ascontiguousarray(table.T) #one row per interest, so each column below is contiguous
+            self.columns = dict(zip(self.interests, table))
+
         elif filepath[-5:] == '.hdf5':
-            file = h5py.File(filepath,'r')
+            import h5py
+
+            with h5py.File(filepath,'r') as file:
+                trim = lambda s: s[2:-1] if s[:2] in ("b'", 'b"') else s #necessary because 2.5.0 imports strings as b'...' instead of just ...
+
+                stimulusData = file.get('/data_collection/condition_variables/EXP_CV_1') #experiment variables
+                sHcutoff = (len(stimulusData.attrs.values())-4)//2 + 3
+                stimulusHeader = list(map(lambda x: trim(str(x)),stimulusData.attrs.values()))[3:sHcutoff]
+
+                trackerData = file.get('/data_collection/events/eyetracker/BinocularEyeSampleEvent') #works even for monocular trackers
+                tHcutoff = (len(trackerData.attrs.values())-4)//2 + 3
+                trackerHeader = list(map(lambda x: trim(str(x)),trackerData.attrs.values()))[3:tHcutoff]
+
+                trackerHeader[trackerHeader.index('time')] = 'device_time_2'
+                trackerHeader[trackerHeader.index('logged_time')] = 'time' #needed to make the rest of the code work
+
+                self.header = stimulusHeader + trackerHeader #header strings
+                self.headerIndex = mapHeader(self.header)
+                self.interests = list(filter(lambda i: i in self.headerIndex, self.interests))
+
+                #stream the tracker samples in chunks of chunkRows, so memory depends on the chunk size rather than the file size;
+                #each chunk reads only logged_time to match samples to trials, then just the interest columns of the rows it keeps
+                stimulus = stimulusData[()] #the stimulus table is small (one row per trial), so read it whole
+                joiner = TrialJoiner(stimulus)
+
+                pieces = dict((i, []) for i in self.interests)
+                trialPieces = []
+                firstRow = None
+
+                for chunkStart in range(0, len(trackerData), chunkRows):
+                    chunkEnd = min(chunkStart+chunkRows, len(trackerData))
+                    (first, last, trials) = joiner.feed(trackerData[chunkStart:chunkEnd, 'logged_time'])
+
+                    if last > first:
+                        if firstRow is None:
+                            firstRow = list(stimulus[trials[0]]) + list(trackerData[chunkStart+first])
+                        trialPieces.append(trials)
+
+                        for i in self.interests:
+                            k = self.headerIndex[i]-len(stimulusHeader)
+                            if k >= 0:
+                                pieces[i].append(trackerData[chunkStart+first:chunkStart+last, trackerData.dtype.names[k]].astype(float))
+
+                    if joiner.done: break #the last relevant trial has passed, so don't read the rest of the file
+
+                #columns come from the stimulus table (one value per trial) or from the tracker rows that were kept
+                trials = np.concatenate(trialPieces) if trialPieces else np.zeros(0, dtype=int)
+                self.columns = {}
+                for i in self.interests:
+                    k = self.headerIndex[i]
+                    if k < len(stimulusHeader):
+                        self.columns[i] = stimulus[stimulus.dtype.names[k]][trials].astype(float)
+                    else:
+                        self.columns[i] = np.concatenate(pieces[i]) if pieces[i] else np.zeros(0)
 
-            if '2.3' in h5py.version.version:
-                trim = lambda s: s
-            else: #'2.5' in h5py.version.version:
-                trim = lambda s: s[2:-1] #necessary because 2.5.0 imports strings as b'...' instead of just ...
-            
-            stimulusData = file.get('/data_collection/condition_variables/EXP_CV_1') #experiment variables
-            sHcutoff = (len(stimulusData.attrs.values())-4)//2 + 3
-            stimulusHeader = list(map(lambda x: trim(str(x)),stimulusData.attrs.values()))[3:sHcutoff]
-            
-            trackerData = file.get('/data_collection/events/eyetracker/BinocularEyeSampleEvent') #works even for monocular trackers
-            tHcutoff = (len(trackerData.attrs.values())-4)//2 + 3
-            trackerHeader = list(map(lambda x: trim(str(x)),trackerData.attrs.values()))[3:tHcutoff]
+        if '# count' not in self.columns:
+            self.columns['# count'] = np.arange(len(self.columns['time']), dtype=float)
+            self.interests.append('# count')
 
-            trackerHeader[trackerHeader.index('time')] = 'device_time_2'
-            trackerHeader[trackerHeader.index('logged_time')] = 'time' #needed to make the rest of the code work
+        ###constant per-file fields, taken from the first row###
+        def field(name): #.hdf5 files give strings as bytes, which are decoded so they compare (and cache) like those of a .dat file
+            value = firstRow[self.headerIndex[name]] if name in self.headerIndex else None
+            return value.decode() if isinstance(value, bytes) else value
+        number = lambda name: float('nan') if field(name) is None else float(field(name))
 
-            r = 0
-            sDrow = stimulusData[0]
-            grabData = 0 #required to drop rows until times match up
-            
-            self.table.append(stimulusHeader + trackerHeader) #header strings
-            for row in list(trackerData): #trackerData is iterable in h5py 2.5.0, but not 2.3.0
-                if grabData == 1:
-                    if row['logged_time'] > sDrow['TRIAL_END']:
-                        r += 1
-                        if r >= len(stimulusData): break
-
-                        sDrow = stimulusData[r]
-                        if sDrow['BLOCK'] == b'SP': break
-                        
-                    self.table.append(list(sDrow)+list(row))
-                else:
-                    if row['logged_time'] > sDrow['TRIAL_START']:
-                        grabData = 1
-                        self.table.append(list(sDrow)+list(row))
+        self.metadata = {'trackerMode': field('Tracker mode'), #'Binocular' or 'Monocular'
+                         'px2deg': number('px2deg'),
+                         'resolution': (number('res_x'), number('res_y'))
+                         }
 
-        if '# count' not in self.table[0]:
-            self.table[0].append('# count')
-            for k in range(len(self.table)-1):
-                self.table[k+1].append(k)
+    def loadCache(self): #picks up the parsed arrays from an earlier run, if the source file hasn't changed since
+        self.requested = list(self.interests)
+        self.cached = False
 
-    def extractData(self):
-        ###preliminary processing###
-        self.header = self.table.pop(0) #separate header from data
+        if self.cache is not None:
+            entry = self.cache.load(self.requested)
+            if entry is not None:
+                (self.interests, self.columns, self.metadata) = entry
+                self.cached = True
 
-        self.interests = list(filter(lambda i: self.header.count(i), self.interests)) #filter out interests that aren't in the table
-        self.indices = [ self.header.index(i) for i in self.interests ] #column indices of those interests
-        
+        return self.cached
+
+    def saveCache(self): #keeps the parsed arrays for the next time this file is opened
+        if self.cache is None: return
+        try:
+            self.cache.save(self.interests, self.requested, self.columns, self.metadata)
+        except (IOError, OSError, TypeError, ValueError) as error: #TypeError/ValueError: metadata that json can't write
+            print("Could not cache {}: {}".format(self.cache.filepath, error))
+
+    @profiled('extractData')
+    def extractData(self):
         ###data extraction###
-        #"one"-liner magic!
-        #data is a dictionary where the interests are keys whose values are lists that contain their respective columns
-        #nonan is the same as data, except that any line with a "nan" somewhere was excluded; hence, there are *no nan*s...
-        if sys.version_info[0] >= 2:
-            data  = dict(zip(self.interests, zip( *[[float(row[k]) for k in self.indices] for row in self.table] ) ))
-            nonan = dict(zip(self.interests,
-                             zip(
-                                 *list(filter(lambda y: len(y)==len(self.indices),
-                                              [ list(filter(lambda x: not math.isnan(x),
-                                                            [float(row[k]) for k in self.indices] )) for row in self.table] )) ) ))
+        #data is a dictionary where the interests are keys whose values are arrays that contain their respective columns
+        #valid marks the rows with no nan in any interest; nonan gives those rows of data on demand, so there are *no nan*s...
+        data = self.columns #memory-mapped from the cache if this file was extracted on an earlier run
+
+        if not self.cached:
+            self.saveCache()
+
+        valid = np.ones(len(data['time']), dtype=bool)
+        for column in data.values():
+            valid &= ~np.isnan(column)
 
         self.data = data
-        self.nonan = nonan
+        self.valid = valid
+        self.nonan = NonanView(data, valid)
         self.dataN = len(data['time']) #number of elements in data/nonan
-        self.nonanN = len(nonan['time'])
+        self.nonanN = int(np.count_nonzero(valid))
 
         self.Hz = (self.dataN-1)/(data['time'][-1] - data['time'][0])   # calculate the hertz
         #print('Averge sampling frequency = {:5.2f} Hz'.format(self.Hz)) # check on the speed
 
-        self.mode = 2 if self.table[0][2]=="Binocular" else 1 #used for calculating the expected number of targets
+        self.mode = 2 if self.metadata['trackerMode']=="Binocular" else 1 #used for calculating the expected number of targets
+
+        self.segments = buildSegmentIndex(data['ROW_INDEX'], 2*int(self.Hz)) #where each target starts and ends
+        self.targets = TargetGrid(data['posx'], data['posy'], data['time'], 2*int(self.Hz)) #where the target was, and when it got there
+        self.timeLookup = SampleLookup(data['time']) #time -> position
+        self.countLookup = SampleLookup(data['# count']) #sample number (the x-axis of the time plots) -> position
+
+    def firstUncoded(self, eye): #where in targetList this eye starts; len(targetList) if all of its targets are coded
+        coded = self.codedTargets.get(eye, set())
+        for k, target in enumerate(self.targetList):
+            if str(target) not in coded:
+                return k
+        return len(self.targetList)
+
+    def openOutput(self):
+        self.selections = SelectionLog() #the selections behind the rows this session adds
+
+        if self.resumeFrom is not None: #carry on in the same file, so the rows coded earlier stay with the new ones
+            self.output = CodedFileWriter(self.csvFileName)
+            self.output.writerow([key+': '+value for key, value in self.resumedInfo.items()])
+            self.output.writerow(self.resumedHeader)
+            for row in self.resumedRows:
+                self.output.writerow(row)
+            return
 
         # Create output datafile, and write header
-        self.csvfile = open(self.csvFileName, 'w')
-        self.fileWriter = csv.writer(self.csvfile, delimiter=',', lineterminator='\n')
-        self.fileWriter.writerow(['filepath: '+self.filepath,
+        self.output = CodedFileWriter(self.csvFileName)
+        self.output.writerow(['filepath: '+self.filepath,
                                   'coder: '+self.coder,
                                   'version: '+VERSION_NUMBER,
                                   'day/time: '+datetime.now().strftime('%Y-%m-%d_%H-%M'),
@@ -153,22 +1190,126 @@ class EyeDataPlot:
                                   ]
                                  )
 
-        headerList = ['Coded by', 'Filename', 'EyeLeftRight', 'Target#', 'targetX', 'targetY', 'Onset (sec)',
-                      'Range start (sec)', 'range start delay', 'range start quality', 'Range end (sec)', 'range end delay', 'range end quality', 'range duration', 'range nonan count x', 'range nonan count y',
-                      'Window start (sec)', 'window start delay', 'Window end (sec)', 'window end delay', 'window quality', 'window duration', 'window nonan count x', 'window nonan count y']
-        
-        for span in ['r_','w_']:
-            for kind in ['X','XErr','Y','YErr','PythErr']:
-                for moment in ['mean','median','mode','stdDev','min','max']:
-                    headerList.append(span+moment+kind)
-                    
-        self.fileWriter.writerow(headerList)
+        self.output.writerow(codedHeader())
+
+    def closeOutput(self): #writes out the .csv, and the log of this session's selections next to it
+        self.output.close()
+        self.selections.dump(self.csvFileName + SELECTIONS_SUFFIX)
+
+    @profiled('findProposals')
+    def findProposals(self, eyes): #maps each eye to its proposals from proposeCodings; needs self.signals
+        validPositions = np.flatnonzero(self.valid)
+        minLength = max(int(round(MIN_FIXATION_SEC*self.Hz)), 1)
+
+        proposals = {}
+        for eye in eyes:
+            fixation = velocityFixations(self.signals[eye]['velocity']) & \
+                       dispersionFixations(self.nonan[eye+'_x'], self.nonan[eye+'_y'], minLength)
+            proposals[eye] = proposeCodings(self.segments, validPositions, fixationRuns(fixation, minLength),
+                                            self.signals[eye]['pyth_err'], self.fixationWindowSec*self.Hz)
+        return proposals
+
+    def targetStatistics(self, eye, r_beg, r_end, w_beg, w_end, targetX, targetY): #statistics of one coded target, as written to the .csv
+        #returns the nonan counts of the range and window x's and y's, and the statistics in statisticColumns() order
+        clean = lambda X: X[~np.isnan(X)] #cleans out the nans
+
+        r_xdats = clean( self.data[eye+'_x'][r_beg:r_end+1] )
+        r_ydats = clean( self.data[eye+'_y'][r_beg:r_end+1] )
+        w_xdats = clean( self.data[eye+'_x'][w_beg:w_end+1] )
+        w_ydats = clean( self.data[eye+'_y'][w_beg:w_end+1] )
+
+        counts = [len(r_xdats), len(r_ydats), len(w_xdats), len(w_ydats)]
+        return counts, statisticsBlock(r_xdats, r_ydats, w_xdats, w_ydats, targetX, targetY).ravel()
+
+    def clickedPositions(self, row, columns, selections=None): #[r_beg, r_end] or [r_beg, r_end, w_beg, w_end] of a coded row, or None
+        #From the row's record in the .selections log, when there is one. Otherwise from the times in the row, which are
+        #written to 3 decimals, so they only pin down a sample if no other sample is within 0.5ms of them; None if one doesn't.
+        names = ['Range start (sec)', 'Range end (sec)', 'Window start (sec)', 'Window end (sec)']
+        if math.isnan( float(row[columns['Window start (sec)']]) ): #no window was selected, because the range was too short
+            names = names[:2]
+
+        if selections is not None:
+            (eye, target) = (row[columns['EyeLeftRight']], int(float(row[columns['Target#']])))
+            for record in selections[::-1]: #the latest selection that wrote this row, if the target was coded more than once
+                positions = [int(record[k]) for k in ['aS', 'aE', 'wS', 'wE'][:len(names)]]
+                if record['eye'].decode() == eye and record['target'] == target and \
+                   all("{:.3f}".format( self.data['time'][k] ) == row[columns[name]] for k, name in zip(positions, names)):
+                    return positions
+
+        positions = [self.timeLookup.only(float(row[columns[name]]), 0.0005 + 1e-9) for name in names] #1e-9: the rounding of the times
+        return None if None in positions else positions
+
+    def recomputeRow(self, row, columns, selections=None): #a coded .csv row with its counts and statistics worked out again from this recording
+        #columns maps the .csv's header strings to column numbers; selections are the records of its .selections log, if any.
+        #Returns None if the clicked samples can't be found again for sure.
+        field = lambda name: float(row[columns[name]])
+        positions = self.clickedPositions(row, columns, selections)
+        if positions is None: return None
+
+        if len(positions) == 2:
+            (r_beg, r_end, w_beg, w_end) = positions + [0, -1]
+            candidates = [r_beg, r_end]
+        else:
+            (r_beg, r_end, w_beg, w_end) = positions
+            candidates = [w_beg, r_beg, r_end] #when coding, the target is read at the window start
+
+        #the target is only written to 3 decimals, so take it from a clicked sample that has that target, at full precision
+        (targetX, targetY) = (field('targetX'), field('targetY'))
+        for k in candidates:
+            if "{:.3f}".format( self.data['posx'][k] ) == row[columns['targetX']] and \
+               "{:.3f}".format( self.data['posy'][k] ) == row[columns['targetY']]:
+                (targetX, targetY) = self.data['posx'][k], self.data['posy'][k]
+                break
 
-    class figure: #not to be confused with plt.figure
+        counts, stats = self.targetStatistics(row[columns['EyeLeftRight']], r_beg, r_end, w_beg, w_end, targetX, targetY)
 
-        mpl.rcParams['toolbar'] = 'None'  # Disable toolbar on matplotlib windows
+        row = list(row)
+        for name, count in zip(['range nonan count x', 'range nonan count y', 'window nonan count x', 'window nonan count y'], counts):
+            row[columns[name]] = "{:.3f}".format( count )
+        for name, stat in zip(statisticColumns(), stats):
+            row[columns[name]] = "{:.3f}".format( stat )
+        return row
+
+    class EyeSession: #an eye being coded: its figure, the target it's on and the samples on show
+        __slots__ = ('iden', 'startSample', 'endSample', 'eye', 'targetIndex', 'figure')
+
+        def __init__(self, iden, startSample, endSample, eye, targetIndex, figure):
+            self.iden = iden #figure id number: 1 for the left eye, 2 for the right
+            self.startSample = startSample #'# count' range of the time plots
+            self.endSample = endSample
+            self.eye = eye #'left_gaze' or 'right_gaze'
+            self.targetIndex = targetIndex #position in targetList
+            self.figure = figure #EyeDataPlot.figure
+
+    class figure: #not to be confused with plt.figure
+        pool = {} #figures kept open from one data file to the next, by id number; makeFigs swaps the new data into them
 
         class Cursor:
+            frameInterval = 15 #msec; motion events that arrive within one frame are painted together
+            __slots__ = ('ax', 'ax2', 'ly_aS', 'ly_aS_2', 'ly_aE', 'ly_aE_2', 'ly_wS', 'ly_wS_2', 'ly_wE', 'ly_wE_2', 'lx_thresh', 'txt',
+                         'clickTime', 'clickDelay', 'timeWindow', 'mouseTimeVal', 'qualityMetric', 'selection', 'proposal',
+                         'XYplotLimits', 'lowQualityThreshold', 'canvas', 'animated', 'blit', 'backgrounds', 'repaintPending', 'repaintTimer')
+
+            class Selection: #what the coder has picked for one target: positions in the data (ints), times (sec) and qualities (floats)
+                __slots__ = ('clicks', 'aS', 'aE', 'wS', 'wE', 'acceptableStart', 'acceptableEnd', 'windowStart', 'windowEnd',
+                             'aS_quality', 'aE_quality', 'wSE_quality', 'confirmClick', 'durTooSmall')
+
+                def __init__(self):
+                    self.clicks = 0 #0: acceptable start next, 1: acceptable end, 2: window, 3: done
+                    self.aS = 0
+                    self.aE = 0
+                    self.wS = 0
+                    self.wE = 0
+                    self.acceptableStart = 0.0
+                    self.acceptableEnd = 0.0
+                    self.windowStart = 0.0
+                    self.windowEnd = 1.0
+                    self.aS_quality = 1.0
+                    self.aE_quality = 1.0
+                    self.wSE_quality = 1.0
+                    self.confirmClick = False #a click below the red line has to be made twice
+                    self.durTooSmall = False
+
             def __init__(self, ax, ax2, timeWindow, showText=False, XYplotLimits=[] ):
                 self.ax = ax
                 self.ax2 = ax2
@@ -184,73 +1325,178 @@ class EyeDataPlot:
                 self.ly_wE_2 = ax2.axvline(color='k')
                 
                 self.lx_thresh = ax.axhline(color='r', linewidth=3)  # the horizontal quality threshold line
+
+                # text location in axes coords
+                self.txt = ax.text( 0.17, 0.92, '', transform=ax.transAxes, color='r', size=16)
+
+                self.clickTime = clock()
+                self.clickDelay = 0.250
+                self.reset(timeWindow, XYplotLimits)
+
+                # blitting: the cursor's lines and text are animated, so full redraws leave them out and
+                # mouse moves only paint them over a cached copy of the rest of each axes
+                self.canvas = ax.figure.canvas
+                self.animated = [self.ly_aS, self.ly_aE, self.ly_wS, self.ly_wE, self.lx_thresh, self.txt,
+                                 self.ly_aS_2, self.ly_aE_2, self.ly_wS_2, self.ly_wE_2]
+                self.blit = getattr(self.canvas, 'supports_blit', hasattr(self.canvas, 'copy_from_bbox'))
+                self.backgrounds = None
+
+                if self.blit:
+                    for artist in self.animated:
+                        artist.set_animated(True)
+                    self.canvas.mpl_connect('draw_event', self.cacheBackgrounds)
+
+                self.repaintPending = False
+                self.repaintTimer = self.canvas.new_timer(interval=self.frameInterval)
+                self.repaintTimer.single_shot = True
+                self.repaintTimer.add_callback(self.repaint)
+
+            def reset(self, timeWindow, XYplotLimits): #no clicks yet; also used when a pooled figure gets a new data file
                 self.timeWindow = timeWindow
                 self.mouseTimeVal = 0.0  # Initialize x-value of mouse position
                 self.qualityMetric = 1.0  # Initialize y-value of mouse position
                 
-                self.confirmClick = False
-                self.durTooSmall = False
-                self.clickTime = time.clock()
-                self.clickDelay = 0.250
-
-                self.clicks = 0
-                self.acceptableStart = 0.0
-                self.aS_quality = 1.0
-                self.acceptableEnd = 0.0
-                self.aE_quality = 1.0
-                self.windowStart = 0.0
-                self.windowEnd = 1.0
-                self.wSE_quality = 1.0
-
-                self.aS = 0
-                self.aE = 0
-                self.wS = 0
+                self.selection = self.Selection() #the clicks made so far for the current target
+                self.proposal = None #(aS, aE, wS, wE) positions offered for the current target, until accepted or dismissed
 
                 self.XYplotLimits = XYplotLimits
-
-                # text location in axes coords
-                self.txt = ax.text( 0.17, 0.92, '', transform=ax.transAxes, color='r', size=16)
+                self.txt.set_text('')
 
                 lQ_ratio = 0.1
                 self.lowQualityThreshold = XYplotLimits[0] + (XYplotLimits[1] - XYplotLimits[0])*lQ_ratio
-                self.lx_thresh.set_ydata(self.lowQualityThreshold)
-
+                self.lx_thresh.set_ydata([self.lowQualityThreshold, self.lowQualityThreshold])
+
+            def cacheBackgrounds(self, event): #after every full redraw, keep what's under the cursor and paint the cursor again
+                self.backgrounds = [self.canvas.copy_from_bbox(ax.bbox) for ax in (self.ax, self.ax2)]
+                self.drawAnimated()
+
+            def drawAnimated(self):
+                for artist in self.animated:
+                    artist.axes.draw_artist(artist)
+
+            def requestRepaint(self): #several motion events between two frames only cause one repaint
+                if not self.repaintPending:
+                    self.repaintPending = True
+                    self.repaintTimer.start()
+
+            @profiled('repaint', 'event')
+            def repaint(self):
+                self.repaintPending = False
+
+                if self.backgrounds is None: #nothing cached yet, or no blitting on this backend
+                    self.canvas.draw_idle()
+                    return
+
+                for background in self.backgrounds:
+                    self.canvas.restore_region(background)
+                self.drawAnimated()
+                for ax in (self.ax, self.ax2):
+                    self.canvas.blit(ax.bbox)
+
+            def showProposal(self, proposal, samples): #puts the lines at a proposed coding; samples are its '# count' values
+                self.proposal = proposal
+                for (lines, x) in zip([(self.ly_aS, self.ly_aS_2), (self.ly_aE, self.ly_aE_2), (self.ly_wS, self.ly_wS_2), (self.ly_wE, self.ly_wE_2)], samples):
+                    for line in lines:
+                        line.set_xdata([x, x])
+                self.txt.set_text( 'CLICK TO ACCEPT, RIGHT-CLICK TO PLACE BY HAND' )
+
+            def dismissProposal(self):
+                self.proposal = None
+                self.selection.clicks = 0
+                self.selection.confirmClick = False
+                self.selection.durTooSmall = False
+                self.txt.set_text( ' ' )
+                self.requestRepaint()
+
+            @profiled('motion', 'event')
             def mouse_move(self, event):
+                global readyForClick
+                selection = self.selection
                 if not event.inaxes == self.ax: return  # Only continue if mouse is in one of the axes
 
                 x, y = event.xdata, event.ydata
                 self.mouseTimeVal = x
 
+                if self.proposal is not None: #the lines stay at the proposal until it's accepted or dismissed
+                    self.qualityMetric = (y-self.lowQualityThreshold)/(self.XYplotLimits[1] - self.lowQualityThreshold)
+                    if y <= self.lowQualityThreshold:
+                        self.txt.set_text( 'RIGHT-CLICK TO PLACE BY HAND' )
+                    else:
+                        self.txt.set_text( 'CLICK TO ACCEPT, RIGHT-CLICK TO PLACE BY HAND' )
+
+                    readyForClick = True
+
+                    self.requestRepaint()
+                    return
+
                 if y <= self.lowQualityThreshold:
-                    if self.confirmClick == False:
+                    if selection.confirmClick == False:
                         self.txt.set_text( 'MARK AS LOW-QUALITY DATA')
                     else:
                         self.txt.set_text( 'CLICK BELOW THE RED LINE TO CONFIRM')
-                elif self.clicks == 2 and self.aE - self.aS < self.timeWindow:
+                elif selection.clicks == 2 and selection.aE - selection.aS < self.timeWindow:
                     self.txt.set_text( 'DURATION TOO SMALL. CLICK TO CONTINUE.' )
-                    self.durTooSmall = True
+                    selection.durTooSmall = True
                 else:
                     self.txt.set_text( ' ')
 
                 self.qualityMetric = (y-self.lowQualityThreshold)/(self.XYplotLimits[1] - self.lowQualityThreshold)
 
                 # update the relevant line positions
-                if self.clicks == 0:
-                    self.ly_aS.set_xdata(x )
-                    self.ly_aS_2.set_xdata(x )
-                elif self.clicks == 1:
-                    self.ly_aE.set_xdata(max([x,self.aS]) )
-                    self.ly_aE_2.set_xdata(max([x,self.aS]) )
-                elif self.clicks == 2 and not (self.aE - self.aS < self.timeWindow):
-                    self.ly_wS.set_xdata( min([max([x,self.aS]), self.aE-self.timeWindow]) )
-                    self.ly_wS_2.set_xdata( min([max([x,self.aS]), self.aE-self.timeWindow]) )
-                    self.ly_wE.set_xdata( min([max([x,self.aS]), self.aE-self.timeWindow]) + self.timeWindow )
-                    self.ly_wE_2.set_xdata( min([max([x,self.aS]), self.aE-self.timeWindow]) + self.timeWindow )
+                if selection.clicks == 0:
+                    self.ly_aS.set_xdata([x, x])
+                    self.ly_aS_2.set_xdata([x, x])
+                elif selection.clicks == 1:
+                    aE = max([x,selection.aS])
+                    self.ly_aE.set_xdata([aE, aE])
+                    self.ly_aE_2.set_xdata([aE, aE])
+                elif selection.clicks == 2 and not (selection.aE - selection.aS < self.timeWindow):
+                    wS = min([max([x,selection.aS]), selection.aE-self.timeWindow])
+                    self.ly_wS.set_xdata([wS, wS])
+                    self.ly_wS_2.set_xdata([wS, wS])
+                    self.ly_wE.set_xdata([wS + self.timeWindow, wS + self.timeWindow])
+                    self.ly_wE_2.set_xdata([wS + self.timeWindow, wS + self.timeWindow])
 
-                global readyForClick
                 readyForClick = True
 
-                plt.draw()
+                self.requestRepaint()
+
+        class LevelOfDetail: #min/max pyramid of one line plotted against time, so the line only holds what its x-range needs
+            maxPoints = 2000 #a visible slice with more samples than this is drawn from the pyramid instead (two points per bin)
+
+            def __init__(self, line, xdata, ydata, levels=None):
+                self.line = line
+                self.setData(xdata, ydata, levels)
+
+            def setData(self, xdata, ydata, levels=None): #xdata must be sorted (it's '# count'); levels from minMaxLevels, if already made
+                self.x = np.asarray(xdata, dtype=float)
+                self.y = np.asarray(ydata, dtype=float)
+                self.levels = levels if levels is not None else minMaxLevels(self.x, self.y, self.maxPoints//2)
+
+                if self.levels: #until the x-range is set, show the whole recording at the coarsest level
+                    self.showLevel(len(self.levels), 0, len(self.x))
+                else:
+                    self.line.set_data(self.x, self.y)
+
+            def showLevel(self, k, beg, end): #draws samples beg to end from level k, as a vertical min-max stroke per bin
+                (x, low, high) = self.levels[k-1]
+                (first, last) = (beg >> k, ((end-1) >> k) + 1)
+                self.line.set_data(np.repeat(x[first:last], 2), np.column_stack((low[first:last], high[first:last])).ravel())
+
+            def update(self, xmin, xmax, fullResolution=False): #swaps in the full-resolution slice, or the coarsest level that still has enough detail
+                beg = max(int(np.searchsorted(self.x, xmin, side='left'))-1, 0) #one sample either side, so the line reaches the edges
+                end = min(int(np.searchsorted(self.x, xmax, side='right'))+1, len(self.x))
+
+                k = 0
+                if not fullResolution and end-beg > self.maxPoints:
+                    k = 1
+                    while k < len(self.levels) and (end-beg) >> k > self.maxPoints//2:
+                        k += 1
+
+                if k == 0:
+                    self.line.set_data(self.x[beg:end], self.y[beg:end])
+                else:
+                    self.showLevel(k, beg, end)
 
         def __init__(self, idnum, XYplotLimits):  ## init for Class figure
 
@@ -259,6 +1505,9 @@ class EyeDataPlot:
             self.axes = {} #axes for positioning widgets
             self.widgets = {} #sliders, buttons, etc.
             self.lines = {} #graphed lines
+            self.detail = {} #level-of-detail pyramids of the lines plotted against time
+            self.codingSpan = None #(startSample, endSample) of the target being coded, which is always drawn at full resolution
+            self.connections = [] #event callbacks of the data file being coded, disconnected when the figure is reused
 
             self.XYplotLimits = XYplotLimits
 
@@ -269,35 +1518,36 @@ class EyeDataPlot:
             self.subs['velocity_sub'] = self.subs['error_sub'].twinx() #and velocity
             self.subs['x_vs_y_sub'] = self.fig.add_subplot(gs[0:12,1]) #right, has eye trace and target grid
             gs.update(left=0.05, right=0.98, top=0.95, bottom=0.05, wspace=0.10, hspace=0.05)
-            
-        ###functions for plotting stuff###
 
-        def calcXYGrid(self, data, attrs): #identifies distinct target points
+            #all the time plots share their x-axis with time_xy_sub, so its x-range decides their level of detail
+            self.subs['time_xy_sub'].callbacks.connect('xlim_changed', self.updateDetail)
 
-            gridXpt = [data['posx'][0]] # start with the first target point
-            gridYpt = [data['posy'][0]]
-            dataN = len(data['time'])
+        def updateDetail(self, ax): #the pyramids are only for views zoomed out past the target being coded
+            (xmin, xmax) = ax.get_xlim()
+            fullResolution = self.codingSpan is not None and self.codingSpan[0] <= xmin and xmax <= self.codingSpan[1]
+            for detail in self.detail.values():
+                detail.update(xmin, xmax, fullResolution)
             
-            for k in range(dataN):
-                if data['posx'][k] != gridXpt[-1] or data['posy'][k] != gridYpt[-1]: #new target point location that's different from the most recent
-                    gridXpt.append(data['posx'][k]) #add new target point location to list
-                    gridYpt.append(data['posy'][k])
-
-            self.XYplotLimits = [min(gridXpt)*1.5, max(gridXpt)*1.5, min(gridYpt)*1.5, max(gridYpt)*1.5]
-
-            return (gridXpt,gridYpt) #return target x and y together
+        ###functions for plotting stuff###
 
-        def graphXYGrid(self, data, attrs, sub, style='x'): #2D graph for target grid
-            (calGridX, calGridY) = self.calcXYGrid(data, attrs) #get target grid xs and ys and graph them
+        def graphXYGrid(self, attrs, sub, targets, style='x'): #2D graph for target grid; targets is the recording's TargetGrid
+            self.XYplotLimits = list(targets.limits)
 
-            self.plotXvsY(data, attrs, sub, style)
+            self.plotXvsY({attrs[0]: targets.locations[:, 0], attrs[1]: targets.locations[:, 1]}, attrs, sub, style) #one marker per location
 
             sub.set_xlim([self.XYplotLimits[0] - 5, self.XYplotLimits[1] + 5]) #don't autozoom out if there are data points far away from target grid
             sub.set_ylim([self.XYplotLimits[2] - 3, self.XYplotLimits[3] + 3])
 
-        def plotDataVsTime(self, data, attrs, sub, style='-'): #graph data lists that correspond to the ones in attrs
+        def plotDataVsTime(self, data, attrs, sub, style='-', levels={}): #graph data lists that correspond to the ones in attrs
+            #levels maps attrs to their minMaxLevels pyramids, for the ones that were worked out beforehand
+            if attrs[1] in self.detail: #already plotted for an earlier data file, so only the data changes
+                for attr in attrs[1:]:
+                    self.detail[attr].setData(data[attrs[0]], data[attr], levels.get(attr))
+                return
+
             for attr in attrs[1:]: #for each attribute, plot that data against time
-                line, = sub.plot(data[attrs[0]], data[attr], style, label=attr)
+                line, = sub.plot([], [], style, label=attr)
+                self.detail[attr] = self.LevelOfDetail(line, data[attrs[0]], data[attr], levels.get(attr)) #puts only the samples needed into the line
                 self.lines[attr] = line
 
             if attr == 'velocity':
@@ -315,6 +1565,10 @@ class EyeDataPlot:
             else:
                 side = attrs[0] #generally, 'posx'
 
+            if side in self.lines: #already plotted for an earlier data file, so only the data changes
+                self.lines[side].set_data(data[attrs[0]], data[attrs[1]])
+                return self.lines[side]
+
             line, = sub.plot(data[attrs[0]], data[attrs[1]], style, label=side) #plots the data
             self.lines[side] = line
 
@@ -323,6 +1577,10 @@ class EyeDataPlot:
 
         def addCursor(self, axName, ax2Name, timeWindow, showText=False, ): #for the vertical bars on the time vs data plot
 
+            if axName+'_cursor' in self.widgets: #already there from an earlier data file
+                self.widgets[axName+'_cursor'].reset(timeWindow, self.XYplotLimits)
+                return self.widgets[axName+'_cursor']
+
             ax = self.subs[axName]
             ax2 = self.subs[ax2Name]
 
@@ -335,100 +1593,101 @@ class EyeDataPlot:
             return self.XYplotLimits
 
     def makeFigs(self): #automatically generates figure(s) for left and/or right eye(s)
+        loadPyplot()
         self.extractData() #extract relevant data from all data
+        self.openOutput() #the .csv that coded targets are written to
+
+        eyes = [eye for eye in ['left_gaze', 'right_gaze'] if eye+'_x' in self.interests]
+        self.signals = deriveSignals(self.data, self.valid, eyes) #Pythagorean error and velocity for every eye at once
+
+        #The arrays behind the plots are worked out before the figures are made: the ones both eyes share once, and each
+        #eye's own (its fixation proposals, nan-filtered trace and level-of-detail pyramids). Working them out in a thread
+        #pool while the figures were made was measured to be no faster, so they're worked out here in turn.
+        data = self.data
+        nonan = self.nonan
+        nonan['# count'] = data['# count'][self.valid] #the x-axis of every eye's error plot, filtered once
+        nonan['# count_v'] = nonan['# count'][1:] #there is one fewer data point in velocity
+        minBins = self.figure.LevelOfDetail.maxPoints//2
+
+        def sharedSeries():
+            return {'levels': dict((attr, minMaxLevels(data['# count'], data[attr], minBins)) for attr in ['posx', 'posy'])}
+
+        def eyeSeries(eye):
+            (x, y) = (eye+'_x', eye+'_y')
+            (P, V) = (self.signals[eye]['pyth_err'], self.signals[eye]['velocity'])
+            return {'proposals': self.findProposals([eye])[eye] if self.proposeFixations else {}, #fixations to start the cursor at
+                    'trace': {x: nonan[x], y: nonan[y]},
+                    'meanError': np.mean(P),
+                    'meanVelocity': np.mean(V),
+                    'levels': {x: minMaxLevels(data['# count'], data[x], minBins),
+                               y: minMaxLevels(data['# count'], data[y], minBins),
+                               'pyth_err': minMaxLevels(nonan['# count'], P, minBins),
+                               'velocity': minMaxLevels(nonan['# count_v'], V, minBins)}}
+
+        common = sharedSeries()
+        series = dict((eye, eyeSeries(eye)) for eye in eyes)
 
         ###plot stuff###
+        @profiled('createFigure')
         def createFigure(attrs, iden):
 
             global globalVmax
 
-            fig = self.figure(iden, XYplotLimits=self.XYplotLimits) #create a pyplot figure
+            fig = self.figure.pool.get(iden)
+            if fig is None: #the first data file, or its window was closed
+                fig = self.figure(iden, XYplotLimits=self.XYplotLimits) #create a pyplot figure
+                self.figure.pool[iden] = fig
 
             x = attrs[0] #'left_gaze_x' or 'right_gaze_x'
             y = attrs[1] #'left_gaze_y' or 'right_gaze_y'
 
-            data = self.data
-            nonan = self.nonan
+            eye = series[x[:-2]]
 
             #2D plot
             xy_sub = fig.subs['x_vs_y_sub']
             
-            fig.lines['currTarget'], = xy_sub.plot([0,0], [0,0], 'rx', markersize=12.0, markeredgewidth=2.0)
-            fig.lines['trace'] = fig.plotXvsY(nonan, [x,y], xy_sub, style='o-') # 2D eye trace
-            fig.graphXYGrid(data, ['posx','posy'], xy_sub) #target grid
+            if 'currTarget' not in fig.lines:
+                fig.lines['currTarget'], = xy_sub.plot([0,0], [0,0], 'rx', markersize=12.0, markeredgewidth=2.0)
+            fig.lines['trace'] = fig.plotXvsY(eye['trace'], [x,y], xy_sub, style='o-') # 2D eye trace
+            fig.graphXYGrid(['posx','posy'], xy_sub, self.targets) #target grid, found once by extractData
 
             self.XYplotLimits = fig.getXYplotLimits()
 
             #data vs time
             self.t_xy_sub = fig.subs['time_xy_sub']
 
-            fig.plotDataVsTime(data, ['# count',x,y], fig.subs['time_xy_sub'], style='.-') #raw data
-            fig.plotDataVsTime(data, ['# count','posx','posy'], fig.subs['time_xy_sub'], style='--') #target position
+            fig.plotDataVsTime(data, ['# count',x,y], fig.subs['time_xy_sub'], style='.-', levels=eye['levels']) #raw data
+            fig.plotDataVsTime(data, ['# count','posx','posy'], fig.subs['time_xy_sub'], style='--', levels=common['levels']) #target position
 
             self.t_xy_sub.set_ylim(min(self.XYplotLimits[0], self.XYplotLimits[2]),
                                    max(self.XYplotLimits[1], self.XYplotLimits[3]))
 
             #error/velocity sub plots
-            P = calculatePythagoreanError(x,y, data, nonan)
-            nonan['pyth_err'] = P #again, because nans are excluded
+            nonan['pyth_err'] = self.signals[x[:-2]]['pyth_err'] #again, because nans are excluded
             err_sub = fig.subs['error_sub'] #get only the subplot for Pythagorean error
-            fig.plotDataVsTime(nonan, ['# count','pyth_err'], err_sub, style='b.-') #graph Pythagorean error by time
+            fig.plotDataVsTime(nonan, ['# count','pyth_err'], err_sub, style='b.-', levels=eye['levels']) #graph Pythagorean error by time
 
-            err_sub.set_ylim([0, sum(P)/len(P)]) #set upper limit to mean of Pythagorean error
+            err_sub.set_ylim([0, eye['meanError']]) #set upper limit to mean of Pythagorean error
 
-            V = calculateUndirectedVelocity(x,y, data, nonan)
-            nonan['velocity'] = V #again, because nans are excluded
-            globalVmax = 10.*sum(V)/len(V)
-            nonan['# count_v'] = nonan['# count'][1:] #there is one fewer data point in velocity
+            nonan['velocity'] = self.signals[x[:-2]]['velocity'] #again, because nans are excluded
+            globalVmax = 10.*eye['meanVelocity']
             vel_sub = fig.subs['velocity_sub'] #get only the subplot for velocity
             vel_sub.set_ylim([0, globalVmax])  #set upper limit to mean of velocity
 
-            fig.plotDataVsTime(nonan, ['# count_v','velocity'], vel_sub, style='g-') #graph velocity
+            fig.plotDataVsTime(nonan, ['# count_v','velocity'], vel_sub, style='g-', levels=eye['levels']) #graph velocity
 
             #add cursor
             fig.addCursor('time_xy_sub', 'error_sub', self.fixationWindowSec * self.Hz)  # Add special cursor to select time window in the top-left plot
 
             return fig
 
-        def calculatePythagoreanError(x,y, data, nonan): #Pythagorean error
-            P = []
-            pos = 0
-            
-            for k in range(len(nonan['time'])):
-                eye_x = nonan[x][k]
-                eye_y = nonan[y][k] #eye position
-
-                while data['time'][pos] < nonan['time'][k]: #used to match data position with nonan position by time
-                    pos += 1
-                targ_x = data['posx'][pos]
-                targ_y = data['posy'][pos] #target position
-                
-                err = math.sqrt( (eye_x - targ_x)**2 + \
-                                 (eye_y - targ_y)**2) #Pythagorean distance between eye position and target position
-                P.append(err)
-
-            return P
-
-        def calculateUndirectedVelocity(x,y, data, nonan): #calculate undirected velocity
-            V = []
-            for k in range(len(nonan['time'])-1):
-                eye_x1 = nonan[x][k]
-                eye_y1 = nonan[y][k]
-                eye_x2 = nonan[x][k+1] #successive eye positions
-                eye_y2 = nonan[y][k+1]
-
-                distance = math.sqrt( (eye_x2-eye_x1)**2 + \
-                                      (eye_y2-eye_y1)**2 ) #Pythagorean distance between successive eye positions
-                timediff = nonan['time'][k+1] - nonan['time'][k] #delta time
-
-                if timediff > 0: #sometimes a time stamp gets duplicated for some reason
-                    velocity = distance / timediff #v = d/t
-                else:
-                    velocity = 0
+        for (iden, fig) in list(self.figure.pool.items()): #pooled figures from the last data file
+            for cid in fig.connections:
+                fig.fig.canvas.mpl_disconnect(cid)
+            fig.connections = []
 
-                V.append(velocity)
-                
-            return V
+            if not plt.fignum_exists(iden): #closed by the coder
+                del self.figure.pool[iden]
 
         try:
             startTime = self.data['# count'][0] #initialize time range to earliest and latest times
@@ -437,321 +1696,296 @@ class EyeDataPlot:
             startTime = 0
             endTime = len(self.data)
 
-        figs = [] #create and keep figure(s)
-        if 'left_gaze_x' in self.interests:
-            figs.append( [1, startTime, endTime, 'left_gaze', 0, \
-                          createFigure(['left_gaze_x','left_gaze_y'], 1)] )
-        if 'right_gaze_x' in self.interests:
-            figs.append( [2, startTime, endTime, 'right_gaze', 0, \
-                          createFigure(['right_gaze_x','right_gaze_y'], 2)] )
-
-        ### structure of figs
-        # figs
-        #   left fig
-        #     1
-        #     <startTime>
-        #     <endTime>
-        #     "left_gaze"
-        #     <initial target number>
-        #     figure
-        #   right fig
-        #     ...
-        ### So the pyplot figure for the left eye is figs[0][-1][0] (or for the right eye if there is no left eye)
+        figs = [] #an EyeSession per eye still being coded; an eye whose targets were all coded in an earlier session gets none
+        if 'left_gaze_x' in self.interests and self.firstUncoded('left_gaze') < len(self.targetList):
+            figs.append( self.EyeSession(1, startTime, endTime, 'left_gaze', self.firstUncoded('left_gaze'), \
+                                         createFigure(['left_gaze_x','left_gaze_y'], 1)) )
+        if 'right_gaze_x' in self.interests and self.firstUncoded('right_gaze') < len(self.targetList):
+            figs.append( self.EyeSession(2, startTime, endTime, 'right_gaze', self.firstUncoded('right_gaze'), \
+                                         createFigure(['right_gaze_x','right_gaze_y'], 2)) )
 
-        def fetchDataByTime(data, attrs, startTime, endTime): #gets the data in a particular time range
-            beg = 0
-            end = len(data['time'])
+        self.proposals = dict((eye, series[eye]['proposals']) for eye in eyes)
+
+        for iden in list(self.figure.pool): #a pooled eye this file doesn't have (or has no targets left for)
+            if iden not in [session.iden for session in figs]:
+                plt.close(iden)
+                del self.figure.pool[iden]
 
-            #finds beginning position of startTime
-            while beg < len(data['time'])-1 and data['time'][beg+1] < startTime:
-                beg += 1
+        if len(figs) == 0: #nothing left to code
+            self.closeOutput()
+            return
 
-            #finds ending position of endTime
-            while end > 0 and data['time'][end-1] > endTime:
-                end -= 1
+        ### So the pyplot figure for the left eye is figs[0].figure.fig (or for the right eye if there is no left eye)
+
+        def fetchDataByTime(data, attrs, startTime, endTime): #gets the data in a particular time range
+            (beg, end) = self.timeLookup.bounds(startTime, endTime) #positions of startTime and endTime
 
             return (data[attrs[0]][beg:end+1], data[attrs[1]][beg:end+1]) #x and y in time range
 
         def fetchDataByRowIndex(data, attrs, RowIndex): # gets the data for a particular target point
 
-            #finds beginning position of RowIndex in ROW_INDEX
-            if RowIndex != data['ROW_INDEX'][0]:
-                first = data['ROW_INDEX'].index(RowIndex)-1
-            else:
-                first = data['ROW_INDEX'].index(RowIndex, 2*int(self.Hz))-1
-            start = first+1
-
-            last = start + 1
-            while last < len(data['ROW_INDEX']) and data['ROW_INDEX'][start] == data['ROW_INDEX'][last]: #find end of target
-                last += 1
+            (first, last) = self.segments[RowIndex] #positions just before and just after the target, found once at load time
 
             return data[attrs[0]][first:last+1], data[attrs[1]][first:last+1], first, last #x and y after target point
 
-        def setDataAndLimits(figure, data, RowIndex):
-            t_xy_sub = figure[-1].subs['time_xy_sub'] #retrieve top left subplot
+        @profiled('setDataAndLimits')
+        def setDataAndLimits(session, data, RowIndex):
+            t_xy_sub = session.figure.subs['time_xy_sub'] #retrieve top left subplot
             
             # We want to select the data with ROW_INDEX == nextTarget (and perhaps another 250msec)
-            (xdats, ydats, first, last) = fetchDataByRowIndex(data, [figure[3]+'_x',figure[3]+'_y'],
+            (xdats, ydats, first, last) = fetchDataByRowIndex(data, [session.eye+'_x',session.eye+'_y'],
                                                          RowIndex) #re-get the data
 
-            trace = figure[-1].lines['trace']
-            (xdats, ydats) = zip(*filter(lambda t: not( math.isnan(t[0]) or math.isnan(t[1])), zip(xdats,ydats))) #Python magic to filter out 'nan's
-                        #in essence, ([1,2,nan,nan,5], [6,nan,8,nan,19]) -> ([1,5], [6,9])
+            trace = session.figure.lines['trace']
+            keep = ~(np.isnan(xdats) | np.isnan(ydats)) #filter out 'nan's
+            (xdats, ydats) = (xdats[keep], ydats[keep]) #in essence, ([1,2,nan,nan,5], [6,nan,8,nan,19]) -> ([1,5], [6,9])
             trace.set_xdata(xdats) #update x and y data of eye trace
             trace.set_ydata(ydats)
 
-            sS2 = first+2
-            currTarget = figure[-1].lines['currTarget'] #set the position of the red target x
-            currTarget.set_xdata( [data['posx'][sS2]] )
-            currTarget.set_ydata( [data['posy'][sS2]] )
+            shown = self.targets.at(first+2) #the target's run, a little into the segment
+            currTarget = session.figure.lines['currTarget'] #set the position of the red target x
+            currTarget.set_xdata( [self.targets.x[shown]] )
+            currTarget.set_ydata( [self.targets.y[shown]] )
 
             startSample = data['# count'][first] #convert from position to sample
             endSample = data['# count'][last]
+            session.figure.codingSpan = (startSample, endSample)
             t_xy_sub.set_xlim(startSample, endSample)
+
+            cursor = session.figure.widgets['time_xy_sub_cursor'] #start the cursor at the fixation found for this target, if there is one
+            proposal = self.proposals.get(session.eye, {}).get(RowIndex)
+            if proposal is not None:
+                cursor.selection.clicks = 0
+                cursor.showProposal(proposal, [data['# count'][k] for k in proposal])
+            else:
+                cursor.proposal = None
             
-            t_xy_sub.set_title('Target #' + str(figure[4]+1) + '        ' + figure[3][:-5] + ' eye') #set the title
+            t_xy_sub.set_title('Target #' + str(session.targetIndex+1) + '        ' + session.eye[:-5] + ' eye') #set the title
 
-            figure[1] = startSample #new time (sample) range is now in effect
-            figure[2] = endSample
+            session.startSample = startSample #new time (sample) range is now in effect
+            session.endSample = endSample
 
-            vel_sub = figure[-1].subs['velocity_sub'] #retrieve velocity subplot
+            vel_sub = session.figure.subs['velocity_sub'] #retrieve velocity subplot
             vel_sub.set_ylim(0,globalVmax)
 
 
-        for figure in figs:
-            setDataAndLimits(figure, self.data, self.targetList[figure[4]]) #set the 2D trace and x-axis limits for first target
+        for session in figs:
+            setDataAndLimits(session, self.data, self.targetList[session.targetIndex]) #set the 2D trace and x-axis limits for first target
 
         plt.draw()
 
-        def defineStatFunctions():
-
-            clean = lambda X: list(filter(lambda x: not math.isnan(x), X)) #cleans out the nans
-
-            #if the list is empty, these functions will return nan
-            mean = lambda X: float("nan") if len(X)==0 else sum(clean(X))/len(clean(X))
-            median = lambda X: float("nan") if len(X)==0 else np.median(clean(X))
-            min2 = lambda X: float("nan") if len(X)==0 else min(X)
-            max2 = lambda X: float("nan") if len(X)==0 else max(X)
-            
-            def stddev(X):
-                if len(X)<=1: return float("nan")
-                xbar=mean(X); return math.sqrt( mean([(x-xbar)**2 for x in X]) )
-            def mode(X):
-                if len(X)==0: return float("nan")
-                X = [round(x,1) for x in clean(X)]
-                X.sort()
-                Y = [X[i+1]-X[i] for i in range(len(X)-1)]
-                
-                m = 0
-                n = 0
-                z = X[0]
-                
-                for j in range(len(Y)):
-                    if Y[j] == 0:
-                        n += 1
-                        if n > m:
-                            m = n
-                            z = X[j]
-                    elif Y[j] != 0:
-                        if n > m:
-                            m = n
-                            z = X[j-1]
-                        n = 0
-
-                return z
-
-            self.functions = [mean, median, mode, stddev, min2, max2]
-        defineStatFunctions()
-
-
+        @profiled('click', 'event')
         def updateDisplayByTarget(event):
 
             global readyForClick
-            clean = lambda X: list(filter(lambda x: not math.isnan(x), X)) #cleans out the nans
-            dist = lambda x1,y1, x2,y2: math.sqrt( (x2-x1)**2+(y2-y1)**2 )
 
-            for figure in figs:
-                if figure[-1].fig.canvas == event.canvas and readyForClick: #meaning I clicked in this figure
+            for session in figs:
+                if session.figure.fig.canvas == event.canvas and readyForClick: #meaning I clicked in this figure
                     readyForClick = False
 
                     #update eye trace, if needed
-                    t_xy_sub = figure[-1].subs['time_xy_sub'] #retrieve top left subplot
+                    t_xy_sub = session.figure.subs['time_xy_sub'] #retrieve top left subplot
 
-                    cursor = figure[-1].widgets['time_xy_sub_cursor']
+                    cursor = session.figure.widgets['time_xy_sub_cursor']
+                    selection = cursor.selection
                     cursorPosition = cursor.mouseTimeVal
                     qualityMetric = cursor.qualityMetric
                     lQT = 0
-                    confirmClick = cursor.confirmClick
-
-                    if figure[-1].subs["time_xy_sub"] == event.inaxes:  # If the mouse_click was in the upper-left subplot
-
-                        truePos = self.data['# count'].index( int(round(cursorPosition)) )
-
-                        if cursor.clicks == 1:
-                            cursorPosition = max([cursorPosition, cursor.aS])
-                        elif cursor.clicks == 2:
-                            cursorPosition = min([max([cursorPosition, cursor.aS]), cursor.aE - self.fixationWindowSec*self.Hz])
+                    confirmClick = selection.confirmClick
+
+                    if session.figure.subs["time_xy_sub"] == event.inaxes:  # If the mouse_click was in the upper-left subplot
+
+                        if cursor.proposal is not None: #one click accepts the proposed coding
+                            if event.button == 3 or qualityMetric <= lQT: #right-click (or below the red line) to place it by hand
+                                cursor.dismissProposal()
+                                return
+                            if clock()-cursor.clickTime <= cursor.clickDelay:
+                                return
+                            cursor.clickTime = clock()
+
+                            (selection.aS, selection.aE, selection.wS, selection.wE) = cursor.proposal
+                            selection.acceptableStart = self.data['time'][selection.aS]
+                            selection.acceptableEnd = self.data['time'][selection.aE]
+                            selection.windowStart = self.data['time'][selection.wS]
+                            selection.windowEnd = self.data['time'][selection.wE]
+                            selection.aS_quality = selection.aE_quality = selection.wSE_quality = float("nan") #accepted, not rated by the coder
+                            cursor.proposal = None
+                            selection.clicks = 3
+                            beg = selection.wS #the target is read here, as for a window placed by hand
+
+                        else:
+                            truePos = self.countLookup.position( int(round(cursorPosition)) )
+
+                            if selection.clicks == 1:
+                                cursorPosition = max([cursorPosition, selection.aS])
+                            elif selection.clicks == 2:
+                                cursorPosition = min([max([cursorPosition, selection.aS]), selection.aE - self.fixationWindowSec*self.Hz])
                             
                         
-                        beg = self.data['# count'].index( int(round(cursorPosition)) )
-                        end = int(round(beg + self.fixationWindowSec * self.Hz))
+                            beg = self.countLookup.position( int(round(cursorPosition)) )
+                            end = int(round(beg + self.fixationWindowSec * self.Hz))
                         
 
-                        if time.clock()-cursor.clickTime > cursor.clickDelay and (qualityMetric > lQT) or (qualityMetric <= lQT and confirmClick == True):
-                            cursor.clickTime = time.clock()
+                            if clock()-cursor.clickTime > cursor.clickDelay and (qualityMetric > lQT) or (qualityMetric <= lQT and confirmClick == True):
+                                cursor.clickTime = clock()
 
-                            if cursor.clicks == 0: #acceptable start
-                                cursor.aS = beg
-                                cursor.acceptableStart = self.data['time'][beg]
-                                cursor.aS_quality = qualityMetric
+                                if selection.clicks == 0: #acceptable start
+                                    selection.aS = beg
+                                    selection.acceptableStart = self.data['time'][beg]
+                                    selection.aS_quality = qualityMetric
                                 
-                                cursor.ly_aS.set_xdata(beg)
-                                cursor.ly_aS_2.set_xdata(beg)
-                                cursor.clicks += 1
-                                cursor.confirmClick = False
+                                    cursor.ly_aS.set_xdata([beg, beg])
+                                    cursor.ly_aS_2.set_xdata([beg, beg])
+                                    selection.clicks += 1
+                                    selection.confirmClick = False
                                 
-                            elif cursor.clicks == 1: #acceptable end
-                                cursor.aE = beg
-                                cursor.acceptableEnd = self.data['time'][beg]
-                                cursor.aE_quality = qualityMetric
-
-                                cursor.ly_aE.set_xdata(beg)
-                                cursor.ly_aE_2.set_xdata(beg)
-                                cursor.clicks += 1
-                                cursor.confirmClick = False
+                                elif selection.clicks == 1: #acceptable end
+                                    selection.aE = beg
+                                    selection.acceptableEnd = self.data['time'][beg]
+                                    selection.aE_quality = qualityMetric
+
+                                    cursor.ly_aE.set_xdata([beg, beg])
+                                    cursor.ly_aE_2.set_xdata([beg, beg])
+                                    selection.clicks += 1
+                                    selection.confirmClick = False
                                 
-                            elif cursor.clicks == 2 and (cursor.aS <= truePos <= cursor.aE or cursor.durTooSmall): #window selection
-
-                                if cursor.durTooSmall:
-                                    cursor.wS = end
-                                    cursor.wE = beg #swapping beg and end causes the later list slice to result in an empty list
-                                    cursor.windowStart = float("nan")
-                                    cursor.windowEnd = float("nan")
-                                    cursor.wSE_quality = -1 #float("nan")
-                                    cursor.durTooSmall = False
-                                else:
-                                    cursor.wS = beg
-                                    cursor.wE = end
-                                    cursor.windowStart = self.data['time'][beg]
-                                    cursor.windowEnd = self.data['time'][end]
-                                    cursor.wSE_quality = qualityMetric
+                                elif selection.clicks == 2 and (selection.aS <= truePos <= selection.aE or selection.durTooSmall): #window selection
+
+                                    if selection.durTooSmall:
+                                        selection.wS = end
+                                        selection.wE = beg #swapping beg and end causes the later list slice to result in an empty list
+                                        selection.windowStart = float("nan")
+                                        selection.windowEnd = float("nan")
+                                        selection.wSE_quality = -1 #float("nan")
+                                        selection.durTooSmall = False
+                                    else:
+                                        selection.wS = beg
+                                        selection.wE = end
+                                        selection.windowStart = self.data['time'][beg]
+                                        selection.windowEnd = self.data['time'][end]
+                                        selection.wSE_quality = qualityMetric
                                     
-                                cursor.clicks += 1
-                                cursor.confirmClick = False
+                                    selection.clicks += 1
+                                    selection.confirmClick = False
 
                             
-                        elif qualityMetric <= lQT and confirmClick == False:
-                            cursor.confirmClick = True
+                            elif qualityMetric <= lQT and confirmClick == False:
+                                selection.confirmClick = True
                             
 
-                        if cursor.clicks == 3:
-                            cursor.clicks = 0
+                        if selection.clicks == 3:
+                            selection.clicks = 0
 
-                            start = self.data['# count'].index( int(round(figure[1]+1)) )
-                            targetPos = (targetX, targetY) = self.data['posx'][beg], self.data['posy'][beg]
+                            start = self.segments[self.targetList[session.targetIndex]][0] + 1 #the target's first sample
+                            onset = self.targets.onset[self.targets.at(start)] #when the target got to where it is now
+                            (targetX, targetY) = self.data['posx'][beg], self.data['posy'][beg]
 
                             #calculate statistics
-                            r_beg = cursor.aS
-                            r_end = cursor.aE
-                            w_beg = cursor.wS
-                            w_end = cursor.wE
-
-                            r_xdats = clean( self.data[figure[3]+'_x'][r_beg:r_end+1] )
-                            r_ydats = clean( self.data[figure[3]+'_y'][r_beg:r_end+1] )
-                            w_xdats = clean( self.data[figure[3]+'_x'][w_beg:w_end+1] )
-                            w_ydats = clean( self.data[figure[3]+'_y'][w_beg:w_end+1] )
-
-                            datsList = []
-
-                            for span in [[r_xdats,r_ydats], [w_xdats,w_ydats]]:
-                                for i,dats in enumerate(span):
-                                    datsList.append(dats)
-                                    datsList.append([d-targetPos[i] for d in dats])
-
-                                datsList.append( clean([ dist(targetX, targetY, *s) for s in zip(*span) ]) )
-
-                            statArray = [["{:.3f}".format( func(dats) ) for func in self.functions] for dats in datsList ]
+                            counts, stats = self.targetStatistics(session.eye, selection.aS, selection.aE, selection.wS, selection.wE, targetX, targetY)
+                            statArray = ["{:.3f}".format( stat ) for stat in stats]
                             
                             #writing out to csv file
                             outList = [self.coder, # Coder ID ('anon' default)
                                        self.fileName, # File data read from
-                                       figure[3], # 'right_gaze' or 'left_gaze'
+                                       session.eye, # 'right_gaze' or 'left_gaze'
 
                                        #target info
-                                       self.targetList[figure[4]], # Which target?
+                                       self.targetList[session.targetIndex], # Which target?
                                        "{:.3f}".format( targetX ),
                                        "{:.3f}".format( targetY ),
-                                       "{:.3f}".format( self.data['time'][start] ), #target onset in seconds
+                                       "{:.3f}".format( onset ), #target onset in seconds
 
                                        #acceptable start/end times, delays, and qualities, and duration
-                                       "{:.3f}".format( cursor.acceptableStart ),
-                                       "{:.3f}".format( cursor.acceptableStart - self.data['time'][start] ),
-                                       "{:.3f}".format( cursor.aS_quality ),
-                                       "{:.3f}".format( cursor.acceptableEnd ),
-                                       "{:.3f}".format( cursor.acceptableEnd - self.data['time'][start] ),
-                                       "{:.3f}".format( cursor.aE_quality ),
-                                       "{:.3f}".format( cursor.acceptableEnd - cursor.acceptableStart ),
-                                       "{:.3f}".format( len(r_xdats) ),
-                                       "{:.3f}".format( len(r_ydats) ),
+                                       "{:.3f}".format( selection.acceptableStart ),
+                                       "{:.3f}".format( selection.acceptableStart - onset ),
+                                       "{:.3f}".format( selection.aS_quality ),
+                                       "{:.3f}".format( selection.acceptableEnd ),
+                                       "{:.3f}".format( selection.acceptableEnd - onset ),
+                                       "{:.3f}".format( selection.aE_quality ),
+                                       "{:.3f}".format( selection.acceptableEnd - selection.acceptableStart ),
+                                       "{:.3f}".format( counts[0] ),
+                                       "{:.3f}".format( counts[1] ),
 
                                        #window start/end times, delays, quality, duration
-                                       "{:.3f}".format( cursor.windowStart ),
-                                       "{:.3f}".format( cursor.windowStart - self.data['time'][start] ),
-                                       "{:.3f}".format( cursor.windowEnd ),
-                                       "{:.3f}".format( cursor.windowEnd - self.data['time'][start] ),
-                                       "{:.3f}".format( cursor.wSE_quality ),
-                                       "{:.3f}".format( cursor.windowEnd - cursor.windowStart ),
-                                       "{:.3f}".format( len(w_xdats) ),
-                                       "{:.3f}".format( len(w_ydats) )
+                                       "{:.3f}".format( selection.windowStart ),
+                                       "{:.3f}".format( selection.windowStart - onset ),
+                                       "{:.3f}".format( selection.windowEnd ),
+                                       "{:.3f}".format( selection.windowEnd - onset ),
+                                       "{:.3f}".format( selection.wSE_quality ),
+                                       "{:.3f}".format( selection.windowEnd - selection.windowStart ),
+                                       "{:.3f}".format( counts[2] ),
+                                       "{:.3f}".format( counts[3] )
                                        ]
 
                             #add statistics to outlist
-                            outList += [item   for sublist in statArray   for item in sublist]
+                            outList += statArray
 
-                            self.fileWriter.writerow(outList)                            
-                            self.csvfile.flush()
+                            self.output.writerow(outList) #reaches the disk within OUTPUT_SYNC_INTERVAL
+                            self.selections.append(session.eye, self.targetList[session.targetIndex], selection)
 
-                            cursor.confirmClick = False
+                            selection.confirmClick = False
                             
                             # move on to next target
-                            figure[4] += 1
+                            session.targetIndex += 1
 
-                            if figure[4] > len(self.targetList)-1: # End of trial...
-                                plt.close(figure[0]) #close figure if all targets have been looked at
+                            if session.targetIndex > len(self.targetList)-1: # End of trial...
+                                figs.remove(session) #all targets have been looked at; the window stays open for the next data file
+                                t_xy_sub.set_title('All targets coded        ' + session.eye[:-5] + ' eye')
+                                plt.draw()
 
                                 if len(figs) == 0:
 									#uncomment to enable email functionality
                                     #email_data(self.csvFileName, self.coder) #reached on Windows
-                                    raise SystemExit #exit program when all figures are closed
-                                else:
-                                    return
+                                    self.closeOutput()
+                                    self.eventLoopCanvas.stop_event_loop() #makeFigs returns, and run2 moves on to the next file
+                                return
 
-                            setDataAndLimits(figure, self.data, self.targetList[figure[4]]) #reset 2D trace and x-axis limits
+                            setDataAndLimits(session, self.data, self.targetList[session.targetIndex]) #reset 2D trace and x-axis limits
 
                             plt.draw()
 
 
         def closeFigure(event): #remove figure from figs
-            for figure in figs:
-                if not plt.fignum_exists(figure[0]): #if figure id number doesn't exist, figure doesn't exist
-                    print("removing figure",figure[0])
-                    figs.remove(figure) #remove from figure list
+            closed = [session for session in figs if not plt.fignum_exists(session.iden)] #if figure id number doesn't exist, figure doesn't exist
+            for session in closed: #looped over apart from figs, which can't shrink while it's being looped over
+                print("removing figure",session.iden)
+                figs.remove(session) #remove from figure list
+                self.figure.pool.pop(session.iden, None)
+
+                if session.figure.fig.canvas is self.eventLoopCanvas: #makeFigs carries on with the loop in the other window
+                    self.eventLoopCanvas.stop_event_loop()
 
             if len(figs) == 0:
 
                 if sys.platform == 'darwin': #only on Macs
 					#uncomment to enable email functionality
                     #email_data(self.csvFileName, self.coder)
-                    
+                    pass
+
+                self.closeOutput() #writes out the .csv
+                if profiler is not None:
+                    profiler.write(self)
                 raise SystemExit #exit program if all figures have been closed
 
-        for figure in figs: #for each figure connect events
-            figure[-1].fig.canvas.mpl_connect('button_release_event', updateDisplayByTarget) #when there's a click, update trace if needed
-            figure[-1].fig.canvas.mpl_connect('close_event', closeFigure) #if the 'x' button is clicked, remove figure from figs list
+        for session in figs: #for each figure connect events
+            canvas = session.figure.fig.canvas
+            session.figure.connections = [canvas.mpl_connect('button_release_event', updateDisplayByTarget), #when there's a click, update trace if needed
+                                      canvas.mpl_connect('close_event', closeFigure), #if the 'x' button is clicked, remove figure from figs list
+                                      canvas.mpl_connect('motion_notify_event', session.figure.widgets['time_xy_sub_cursor'].mouse_move)]
 
-            figure[-1].fig.canvas.mpl_connect('motion_notify_event', figure[-1].widgets['time_xy_sub_cursor'].mouse_move)
+        if startupSteps is not None:
+            startupSteps.append(('figures', time.time()))
+        reportStartup()
 
-        plt.show()
+        #run the event loop until every eye is coded, instead of plt.show(), so the windows stay open for the next file
+        self.eventLoopCanvas = figs[0].figure.fig.canvas #the loop has to be stopped through the canvas that started it
+        plt.show(block=False)
+        while len(figs) > 0:
+            self.eventLoopCanvas = figs[0].figure.fig.canvas
+            self.eventLoopCanvas.start_event_loop(0)
+
+        if profiler is not None:
+            profiler.write(self)
 
         
 
@@ -790,12 +2024,17 @@ def email_data(dataFileName, coder):
     print("Email sent!")
     
 
-def run(name, coder='anon', fWS=0.100, targets=[]):
+def run(name, coder='anon', fWS=0.100, targets=[], resume=False):
+
+    resumeFrom = partialCodedFile(name, coder) if resume else None #carry on where an earlier session stopped
+    if resumeFrom is not None:
+        print("Resuming {}".format(resumeFrom))
 
     myEyeDataPlot = EyeDataPlot(name, coder, targets,
                                 targetDuration=1.000,
                                 timeAfterTarget=0,
-                                fixationWindowSec=fWS) #reads data
+                                fixationWindowSec=fWS,
+                                resumeFrom=resumeFrom) #reads data
 
     try:
         myEyeDataPlot.makeFigs() #makes the figures
@@ -809,12 +2048,7 @@ def run(name, coder='anon', fWS=0.100, targets=[]):
         print( "Error: %s" % e )
         raise error
 
-def run2(filepath, coder='anon'):
-
-    if sys.version_info[0] == 2:
-        strfunc = unicode
-    else:
-        strfunc = str #another instance where Python 3 merged functions
+def run2(filepath, coder='anon', resume=False):
 
     with open(filepath, 'r') as f:
         lines = f.read().splitlines()
@@ -826,10 +2060,10 @@ def run2(filepath, coder='anon'):
             fixationWindowWidth = float(Lsplit[1])
 
             if Lsplit[2] == 'r': #random mode
-                if len(Lsplit) > 3 and strfunc(Lsplit[3]).isnumeric():
+                if len(Lsplit) > 3 and Lsplit[3].isnumeric():
                     n = int(Lsplit[3])
 
-                    if len(Lsplit) > 4 and strfunc(Lsplit[4]).isnumeric():
+                    if len(Lsplit) > 4 and Lsplit[4].isnumeric():
                         seed = int(Lsplit[4])
                     else:
                         seed = 0
@@ -848,21 +2082,52 @@ def run2(filepath, coder='anon'):
                 targets = [int(t) for t in Lsplit[2:]]
                 
             #print(' ',filename,'\t',targets)
-            run(folderpath+filename, coder, fixationWindowWidth, targets)
+            run(folderpath+filename, coder, fixationWindowWidth, targets, resume)
+
+def prefetchRecording(filepath): #prefetch worker: parses a data file into its cache, so opening it later is quick
+    try:
+        plot = EyeDataPlot(filepath, 'prefetch')
+        if not plot.cached:
+            plot.saveCache()
+        return filepath, None
+    except Exception as error: #the file will just be parsed when it's opened
+        return filepath, "{}: {}".format(type(error).__name__, error)
+
+def startPrefetch(filepaths): #parses the files in a background process pool; returns the pool, or None if there's nothing to do
+    import multiprocessing
+
+    filepaths = [f for f in filepaths if os.path.isfile(f)]
+    if len(filepaths) == 0: return None
+
+    def report(results):
+        for filepath, error in results:
+            if error is not None:
+                print("Could not preprocess {}: {}".format(filepath, error))
+
+    def reportError(error):
+        print("Could not preprocess the next data files: {}".format(error))
+
+    pool = multiprocessing.Pool(min(len(filepaths), multiprocessing.cpu_count()))
+    pool.map_async(prefetchRecording, filepaths, callback=report, error_callback=reportError)
+    pool.close() #no more work will be added; finishPrefetch waits for what was started
+    return pool
+
+def finishPrefetch(pool):
+    if pool is None: return
+    print("Finishing the preprocessing of the next data files...")
+    pool.join()
 
 def run3():    
     import os.path
 
+    if os.path.isdir('Data files'):
+        recoverJournals('Data files') #.csv files of coding that was cut short by a crash
+
     if sys.platform == 'win32' and not os.path.isfile("codedFiles.txt"):
         #a Windows .exe opens up a terminal that can be used for input/output
         #a Mac .app does not, so this portion cannot be used on a Mac
 
-        if sys.version_info[0] == 2:
-            inputFunc = raw_input
-        else:
-            inputFunc = input #Python 3's input == Python 2's raw_input
-
-        coderName = inputFunc("Please enter your initials: ")
+        coderName = input("Please enter your initials: ")
             
         with open("codedFiles.txt", 'w') as file: #initialize codedFiles with the coder's initials
             file.write(coderName+'\n')
@@ -876,50 +2141,54 @@ def run3():
     with open("dataFileList.txt", 'r') as dataFileList: #this file stores the name and parameters for each data file of interest
         files = dataFileList.read().splitlines()
         
-        for line in files:
-            if line.split(',')[0] not in doneFiles: #looks for the first file name that hasn't already been coded
-                #print(line)
+        resume = False
+        for k, line in enumerate(files): #a file that was closed before all of its targets were coded comes first
+            if line.split(',')[0] in doneFiles and partialCodedFile('Data files/'+line.split(',')[0], coder) is not None:
+                resume = True
                 break
 
-        if line != files[-1] or line.split(',')[0] not in doneFiles: #one has been found
+        if not resume:
+            for k, line in enumerate(files):
+                if line.split(',')[0] not in doneFiles: #looks for the first file name that hasn't already been coded
+                    #print(line)
+                    break
+
+        if resume or line != files[-1] or line.split(',')[0] not in doneFiles: #one has been found
             
             with open("inputFile.txt", 'w') as inputFile: #creates input file for passing to run2
                 inputFile.write(coder+',Data files/\n')
                 inputFile.write(line+'\n')
 
             #disable the following two lines if you want to repeatedly test the program
-            with open("codedFiles.txt", 'a') as doneFileList: #adds file name to list of done file names
-                doneFileList.write(line.split(',')[0]+'\n')
+            if not resume: #a resumed file is already listed
+                with open("codedFiles.txt", 'a') as doneFileList: #adds file name to list of done file names
+                    doneFileList.write(line.split(',')[0]+'\n')
+
+            #the next few files get parsed in the background while this one is coded, so they open straight away
+            upcoming = [L.split(',')[0] for L in files[k+1:] if L and L.split(',')[0] not in doneFiles][:PREFETCH_COUNT]
+            pool = startPrefetch(['Data files/'+name for name in upcoming])
 
             #print("Running the program on {}".format(line.split(',')[0]))
-            run2("inputFile.txt") #runs the program on that data file
+            try:
+                run2("inputFile.txt", resume=resume) #runs the program on that data file
+            finally:
+                finishPrefetch(pool)
 
         else: #all data files have already been done
 
-            #create and email compendium file if needed
-            if not os.path.isfile("compendium_"+coder+".csv"):
-                print("Creating compendium...")
-                allFileNames = os.listdir('Data files')
-                allCSVFiles = list(filter(lambda n: n[-4:]=='.csv' and n[-21]=='_', allFileNames)) #also excludes copies
-                nameDate = [[filename[:-21],filename[-21:]] for filename in allCSVFiles]
-                nameDate.sort(key=lambda x:x[1], reverse=True)
-
-                usedNames = []
-                useFileList = []
-                for name, date in nameDate:
-                    if name.count('_') and name[:name.index('_')] not in usedNames:
-                        usedNames.append(name[:name.index('_')])
-                        useFileList.append(name+date)
-
-                with open("compendium_"+coder+".csv", 'a') as outfile:
-                    for filename in useFileList:
-                        print(filename)
-                        outfile.write( open('Data files/'+filename,'r').read()+'\n' )
-
-				#uncomment to enable email functionality
-                #email_data("compendium_"+coder+".csv", useFileList[0].split('_')[1])
+            #bring the compendium up to date with new or changed coded files, and write it out
+            print("Updating compendium...")
+            compendium = Compendium()
+            compendium.ingest('Data files')
+            compendium.export("compendium_"+coder+".csv")
+            compendium.close()
+
+			#uncomment to enable email functionality
+            #email_data("compendium_"+coder+".csv", coder)
 
             #pop up a window telling the user that they're done
+            loadPyplot()
+            reportStartup()
             fig = plt.figure()
             fig.text(0.5,0.5,
                         "You have coded all data files.\nThank you for participating.\n\nClick anywhere to exit.",
@@ -928,9 +2197,382 @@ def run3():
             fig.canvas.mpl_connect('button_release_event', lambda fig: plt.close())
             plt.show()
 
+def findRecording(csvPath, filepath): #the data file a coded .csv was made from, as run from the program's folder or next to the .csv
+    for candidate in [filepath, os.path.join(os.path.dirname(csvPath), os.path.basename(filepath))]:
+        if os.path.isfile(candidate):
+            return candidate
+    raise IOError("data file {} of {} not found".format(filepath, csvPath))
+
+def recomputeCodedFiles(task): #batch worker: loads one recording, then rewrites every coded .csv made from it
+    recordingPath, csvPaths, outFolder = task
+    results = []
+
+    plot = None
+    for csvPath in csvPaths:
+        try:
+            info, header, rows = readCodedFile(csvPath)
+            columns = mapHeader(header)
+            selections = readSelectionLog(csvPath + SELECTIONS_SUFFIX)
+
+            if plot is None:
+                plot = EyeDataPlot(recordingPath, info.get('coder', 'anon'))
+                plot.extractData() #no figures and no output file, just the arrays
+
+            out, skipped = [], [] #rows whose samples can't be found again are left as they were, rather than recomputed wrongly
+            for row in rows:
+                recomputed = plot.recomputeRow(row, columns, selections)
+                if recomputed is None:
+                    skipped.append(row[columns['EyeLeftRight']] + ' ' + row[columns['Target#']])
+                out.append(row if recomputed is None else recomputed)
+
+            writeCodedFile(os.path.join(outFolder, os.path.basename(csvPath)),
+                           [[key+': '+value for key, value in info.items()], header] + out)
+
+            results.append((csvPath, len(rows) - len(skipped), skipped, None))
+        except Exception as error: #one bad file shouldn't stop the batch
+            results.append((csvPath, 0, [], "{}: {}".format(type(error).__name__, error)))
+
+    return results
+
+def runBatch(folder, outFolder=None, workers=None): #recomputes the statistics of every coded .csv in folder, without any figures
+    import multiprocessing
+
+    recoverJournals(folder)
+
+    if outFolder is None:
+        outFolder = os.path.join(folder, 'recomputed')
+    if not os.path.isdir(outFolder):
+        os.makedirs(outFolder)
+
+    tasks = {} #recording -> the coded files made from it, so each recording is only loaded once
+    for name in sorted(os.listdir(folder)):
+        csvPath = os.path.join(folder, name)
+        if name[-4:] != '.csv' or len(name) < 21 or name[-21] != '_': #only coded files (not copies or compendia)
+            continue
+        try:
+            info, header, rows = readCodedFile(csvPath)
+            recordingPath = findRecording(csvPath, info['filepath'])
+        except (IOError, OSError, ValueError, csv.Error) as error:
+            print("Skipping {}: {}".format(csvPath, error))
+            continue
+        tasks.setdefault(os.path.abspath(recordingPath), []).append(csvPath)
+
+    if workers is None:
+        workers = min(len(tasks), multiprocessing.cpu_count()) or 1
+
+    pool = multiprocessing.Pool(workers)
+    try:
+        for results in pool.imap_unordered(recomputeCodedFiles, [(r, c, outFolder) for r, c in tasks.items()]):
+            for csvPath, n, skipped, error in results:
+                if error is None:
+                    print("{}: {} rows recomputed".format(csvPath, n))
+                    if skipped:
+                        print("  {} rows left as they were, since their samples are too close together to find from the times"
+                              " in the .csv and they aren't in a {} log: {}".format(len(skipped), SELECTIONS_SUFFIX, ', '.join(skipped)))
+                else:
+                    print("Could not recompute {}: {}".format(csvPath, error))
+    finally:
+        pool.close()
+        pool.join()
+
+def runAgreement(folder, outPrefix='agreement'): #compares the coders of every coded .csv in folder; writes <outPrefix>_targets/_pairs/_coders.csv
+    recoverJournals(folder)
+
+    compendium = Compendium(':memory:') #the same superseding rules as the compendium, without keeping a database
+    compendium.ingest(folder)
+    codings = list(compendium.currentRows())
+    compendium.close()
+
+    tables = agreement(codings)
+    for name, rows in zip(['targets', 'pairs', 'coders'], tables):
+        writeCodedFile(outPrefix+'_'+name+'.csv', rows)
+    print("{} codings of {} targets by {} coders compared".format(len(codings), len(tables[0])-1, len(tables[2])-1))
+
+###synthetic recordings###
+#Made-up recordings laid out like the eyefollower files, for trying the program at rates and lengths there's no real data for.
+
+SYNTHETIC_HEADER = ['# count', 'Eye tracker', 'Tracker mode', 'Tracker SamplingRate', 'Screen_size_w_mm', 'Screen_size_h_mm',
+                    'res_x', 'res_y', 'Distance_to_screen_mm', 'px2deg', 'Operator', 'Participant ID', 'ROW_INDEX',
+                    'posx', 'posx_px', 'posy', 'posy_px', 'TRIAL_START', 'TRIAL_END', 'time',
+                    'left_gaze_x', 'left_gaze_x_px', 'left_gaze_y', 'left_gaze_y_px', 'left_pupil_measure1',
+                    'right_gaze_x', 'right_gaze_x_px', 'right_gaze_y', 'right_gaze_y_px', 'right_pupil_measure1']
+
+def syntheticSamples(Hz=60., duration=SYNTHETIC_DURATION, seed=0, dropout=0.01): #(constants, columns) of a made-up binocular recording
+    #The 49 targets of the 7x7 grid are shown in a random order and then the first one again, as in the eyefollower files,
+    #each for an equal share of duration. At each target the eyes wait out a reaction time, make a saccade to it, land a
+    #little off and fixate there with jitter and drift. Blinks blank both eyes; dropout is the share of lost samples per eye.
+    rng = np.random.RandomState(seed)
+    px2deg = 44.1051330566
+
+    n = int(round(duration*Hz))
+    time = 364.44 + np.arange(n)/Hz
+    order = rng.permutation(49)
+    order = np.append(order, order[0])
+    bounds = np.round(np.linspace(0, n, len(order)+1)).astype(int) #where each target starts, and the end of the recording
+    trial = np.repeat(np.arange(len(order)), np.diff(bounds))
+
+    targX = (order % 7 - 3) * 7.21372556686 #deg
+    targY = (3 - order // 7) * 4.03949165344
+
+    landX = targX + rng.normal(0., 0.4, len(order)) #where each saccade lands
+    landY = targY + rng.normal(0., 0.4, len(order))
+    fromX = np.append(0., landX[:-1]) #where each one starts from
+    fromY = np.append(0., landY[:-1])
+    latency = rng.uniform(0.15, 0.30, len(order)) #sec
+    saccade = 0.020 + 0.002*np.hypot(landX-fromX, landY-fromY) #sec; longer for bigger saccades
+
+    since = time - time[bounds[:-1]][trial] #time since the target appeared
+    progress = np.clip((since - latency[trial]) / saccade[trial], 0., 1.)
+    shape = (1. - np.cos(np.pi*progress)) / 2. #smooth start and end of each saccade
+
+    columns = {'# count': np.arange(n, dtype=float),
+               'ROW_INDEX': order[trial].astype(float),
+               'posx': targX[trial],
+               'posy': targY[trial],
+               'TRIAL_START': (time[bounds[:-1]] - 0.5/Hz)[trial],
+               'TRIAL_END': (time[bounds[1:]-1] + 0.5/Hz)[trial],
+               'time': time}
+
+    blinks = np.zeros(n, dtype=bool)
+    for start in rng.uniform(0., duration, rng.poisson(duration/4.)): #a blink every 4 sec or so
+        blinks[int(start*Hz):int((start + rng.uniform(0.1, 0.3))*Hz)] = True
+
+    jitterTime = np.arange(int(duration*60.) + 2) / 60. #jitter is drawn at 60 Hz and interpolated, so faster trackers see the same eyes rather than more noise
+    jitter = lambda: np.interp(time - time[0], jitterTime, rng.normal(0., 0.03, len(jitterTime)))
+
+    vergence = rng.normal(0., 0.3, 2) #the right eye is a little off from the left one
+    for eye, offset in [('left_gaze', (0., 0.)), ('right_gaze', vergence)]:
+        lost = blinks | (rng.uniform(size=n) < dropout)
+        for axis, start, end, shift in [('x', fromX, landX, offset[0]), ('y', fromY, landY, offset[1])]:
+            drift = np.cumsum(rng.normal(0., 0.1/math.sqrt(Hz), n)) #random walk of 0.1 deg per sqrt(sec), restarted at each target
+            position = start[trial] + (end - start)[trial]*shape + shift + (drift - drift[bounds[:-1]][trial]) + jitter()
+            columns[eye+'_'+axis] = np.where(lost, np.nan, position)
+        columns[eye.replace('gaze', 'pupil_measure1')] = np.where(lost, np.nan, rng.normal(1.4, 0.02, n))
+
+    for name in ['posx', 'posy', 'left_gaze_x', 'left_gaze_y', 'right_gaze_x', 'right_gaze_y']:
+        columns[name+'_px'] = np.round(columns[name]*px2deg)
+
+    constants = {'Eye tracker': 'Synthetic', 'Tracker mode': 'Binocular', 'Tracker SamplingRate': Hz,
+                 'Screen_size_w_mm': 531.9, 'Screen_size_h_mm': 299.2, 'res_x': 1920., 'res_y': 1080.,
+                 'Distance_to_screen_mm': 700., 'px2deg': px2deg, 'Operator': 'SY', 'Participant ID': float(seed)}
+    return constants, columns
+
+def writeSyntheticRecording(filepath, Hz=60., duration=SYNTHETIC_DURATION, seed=0, dropout=0.01): #syntheticSamples(...) as a .dat or an .hdf5
+    (constants, columns) = syntheticSamples(Hz, duration, seed, dropout)
+
+    if filepath[-4:] == '.dat':
+        #the constants go straight into the row format, so only the sample columns are formatted
+        rowFormat = '\t'.join(str(constants[name]) if name in constants else '%.12g' for name in SYNTHETIC_HEADER)
+        table = np.column_stack([columns[name] for name in SYNTHETIC_HEADER if name not in constants])
+        np.savetxt(filepath, table, fmt=rowFormat, header='\t'.join(SYNTHETIC_HEADER), comments='')
+
+    elif filepath[-5:] == '.hdf5':
+        #ioHub's layout: one stimulus table row per target, and the tracker samples with their logged times
+        import h5py
+
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(columns['TRIAL_START'])) + 1)) #first sample of each target
+        stimulusNames = SYNTHETIC_HEADER[1:SYNTHETIC_HEADER.index('time')]
+        stimulus = np.zeros(len(starts), dtype=[(name, 'S16' if isinstance(constants.get(name), str) else 'f8') for name in stimulusNames] + \
+                                               [('BLOCK', 'S16')])
+        for name in stimulusNames:
+            stimulus[name] = constants[name] if name in constants else columns[name][starts]
+        stimulus['BLOCK'] = b'EXP'
+
+        trackerNames = [('experiment_id', 'u4'), ('session_id', 'u4'), ('device_id', 'u2'), ('event_id', 'u4'), ('type', 'u1'),
+                        ('device_time', 'f4'), ('logged_time', 'f8'), ('time', 'f8'), ('confidence_interval', 'f4'), ('delay', 'f4'),
+                        ('filter_id', 'i2'), ('left_gaze_x', 'f4'), ('left_gaze_y', 'f4'), ('left_pupil_measure1', 'f4'),
+                        ('right_gaze_x', 'f4'), ('right_gaze_y', 'f4'), ('right_pupil_measure1', 'f4'), ('status', 'u1')]
+        tracker = np.zeros(len(columns['time']), dtype=trackerNames)
+        tracker['experiment_id'] = tracker['session_id'] = 1
+        tracker['event_id'] = np.arange(len(tracker)) + 1
+        tracker['type'] = 52 #ioHub's BINOCULAR_EYE_SAMPLE
+        tracker['device_time'] = tracker['logged_time'] = tracker['time'] = columns['time']
+        for name in ['left_gaze_x', 'left_gaze_y', 'left_pupil_measure1', 'right_gaze_x', 'right_gaze_y', 'right_pupil_measure1']:
+            tracker[name] = columns[name]
+
+        with h5py.File(filepath, 'w') as file:
+            for path, table in [('/data_collection/condition_variables/EXP_CV_1', stimulus),
+                                ('/data_collection/events/eyetracker/BinocularEyeSampleEvent', tracker)]:
+                dataset = file.create_dataset(path, data=table, track_order=True) #readData finds the field names by attribute order
+                dataset.attrs['CLASS'] = np.bytes_(b'TABLE')
+                dataset.attrs['VERSION'] = np.bytes_(b'2.7')
+                dataset.attrs['TITLE'] = np.bytes_(b'')
+                for k, name in enumerate(table.dtype.names):
+                    dataset.attrs['FIELD_{}_NAME'.format(k)] = np.bytes_(name.encode())
+                for k, name in enumerate(table.dtype.names):
+                    dataset.attrs['FIELD_{}_FILL'.format(k)] = np.zeros(1, dtype=table.dtype[name])[0]
+                dataset.attrs['NROWS'] = len(table)
+
+    else:
+        raise ValueError("synthetic recordings are written as .dat or .hdf5, not {}".format(filepath))
+
+###benchmarks###
+
+def resultDigest(values): #short hash of a stage's results, rounded so it only changes when the results really do
+    digest = hashlib.sha1()
+    for value in values:
+        digest.update(np.round(np.asarray(value, dtype=float), 6) + 0.) #+ 0. turns -0. into 0.
+    return digest.hexdigest()[:12]
+
+def pipelineStages(filepath, useCache=False): #[(stage, function)] that load and code one recording without figures, in order
+    #each function carries on from the previous ones and returns the digest of what it worked out
+    state = {}
+
+    def readData(): #with useCache, every run after the first loads the cache entry that the first one saved
+        state['plot'] = plot = EyeDataPlot(filepath, 'benchmark', useCache=useCache)
+        return resultDigest(plot.columns[i] for i in sorted(plot.columns))
+
+    def extractData():
+        plot = state['plot']
+        plot.extractData()
+        if plot.cache is not None and not os.path.isfile(plot.cache.stem+'.json'):
+            raise IOError("{} was not cached".format(filepath))
+        state['eyes'] = [eye for eye in ['left_gaze', 'right_gaze'] if eye+'_x' in plot.interests]
+        return resultDigest([plot.valid])
+
+    def segments():
+        plot = state['plot']
+        segments = buildSegmentIndex(plot.data['ROW_INDEX'], 2*int(plot.Hz))
+        return resultDigest([sorted((key,) + value for key, value in segments.items())])
+
+    def signals():
+        plot = state['plot']
+        plot.signals = deriveSignals(plot.data, plot.valid, state['eyes'])
+        return resultDigest(plot.signals[eye][kind] for eye in state['eyes'] for kind in ['pyth_err', 'velocity'])
+
+    def proposals():
+        plot = state['plot']
+        plot.proposals = plot.findProposals(state['eyes'])
+        return resultDigest([sorted((key,) + value for key, value in plot.proposals[eye].items()) or [()] for eye in state['eyes']])
+
+    def statistics(): #each proposed target coded as it would be by accepting the proposal
+        plot = state['plot']
+        results = []
+        for eye in state['eyes']:
+            for target in plot.targetList:
+                if target not in plot.proposals[eye]: continue
+                (aS, aE, wS, wE) = plot.proposals[eye][target]
+                counts, stats = plot.targetStatistics(eye, aS, aE, wS, wE, plot.data['posx'][wS], plot.data['posy'][wS])
+                results.append(np.append(counts, stats))
+        return resultDigest(results)
+
+    return [('readData', readData), ('extractData', extractData), ('segments', segments),
+            ('signals', signals), ('proposals', proposals), ('statistics', statistics)]
+
+def benchmarkRecording(filepath, repeats=BENCHMARK_REPEATS, useCache=False): #{stage: {'seconds', 'peakMB', 'digest'}} for one recording
+    import tracemalloc
+
+    results = {}
+    for run in range(repeats):
+        for stage, function in pipelineStages(filepath, useCache):
+            start = time.time()
+            digest = function()
+            seconds = time.time() - start
+            if stage not in results or seconds < results[stage]['seconds']:
+                results[stage] = {'seconds': seconds, 'digest': digest}
+
+    for stage, function in pipelineStages(filepath, useCache): #one more run for memory, since tracing slows everything down
+        tracemalloc.start()
+        function()
+        results[stage]['peakMB'] = tracemalloc.get_traced_memory()[1] / 1024.**2
+        tracemalloc.stop()
+
+    return results
+
+def runBenchmark(baselinePath=BENCHMARK_BASELINE, saveBaseline=False, rates=BENCHMARK_RATES, repeats=BENCHMARK_REPEATS):
+    #times each stage on synthetic .dat and .hdf5 recordings at each rate, and reports the stages that got slower,
+    #use more memory or give different results than in the baseline. Returns the number of those.
+    import shutil
+    import tempfile
+
+    formats = ['.dat', '.hdf5', '.hdf5+cache'] #+cache: the same file read back from its cache entry
+    try:
+        import h5py
+    except ImportError:
+        print("h5py is not installed, so only .dat files are benchmarked")
+        formats = ['.dat']
+
+    results = {}
+    folder = tempfile.mkdtemp()
+    try:
+        for Hz in rates:
+            for extension in formats:
+                filepath = os.path.join(folder, 'synthetic-{:g}Hz{}'.format(Hz, extension.split('+')[0]))
+                if not os.path.isfile(filepath):
+                    writeSyntheticRecording(filepath, Hz)
+                for stage, result in benchmarkRecording(filepath, repeats, useCache=extension.endswith('+cache')).items():
+                    results['{:g}Hz{} {}'.format(Hz, extension, stage)] = result
+    finally:
+        shutil.rmtree(folder)
+
+    baseline = {}
+    if os.path.isfile(baselinePath) and not saveBaseline:
+        with open(baselinePath) as file:
+            baseline = json.load(file)
+
+    regressions = 0
+    print("{:<30}{:>10}{:>10}{:>14}  {}".format('stage', 'sec', 'peak MB', 'digest', 'compared with baseline'))
+    order = [stage for stage, function in pipelineStages(None)]
+    for key in sorted(results, key=lambda key: (float(key.split('Hz')[0]), key.split()[0], order.index(key.split()[1]))):
+        result = results[key]
+        notes = []
+        if key in baseline:
+            before = baseline[key]
+            if result['digest'] != before['digest']:
+                notes.append("results changed")
+            if result['seconds'] > BENCHMARK_TOLERANCE*before['seconds'] and result['seconds'] > before['seconds'] + 0.010: #stages of a few ms are mostly timer noise
+                notes.append("{:.1f}x slower".format(result['seconds']/before['seconds']))
+            if result['peakMB'] > BENCHMARK_TOLERANCE*before['peakMB'] and result['peakMB'] > before['peakMB'] + 1.:
+                notes.append("{:.1f}x memory".format(result['peakMB']/before['peakMB']))
+            regressions += len(notes) > 0
+        print("{:<30}{:>10.3f}{:>10.1f}{:>14}  {}".format(key, result['seconds'], result['peakMB'], result['digest'],
+                                                        ', '.join(notes) or ('ok' if key in baseline else 'new')))
+
+    if saveBaseline or not baseline:
+        with open(baselinePath, 'w') as file:
+            json.dump(results, file, indent=1, sort_keys=True)
+        print("Baseline saved to {}".format(baselinePath))
+    elif regressions:
+        print("{} stages regressed".format(regressions))
+
+    return regressions
+
+
+startupSteps.append(('program', time.time()))
 
 if __name__ == '__main__':
     #email_data("codedFiles.txt","LTB") #uncomment to test email functionality only
     #raise SystemExit
 
-    run3()
+    import multiprocessing
+    multiprocessing.freeze_support() #the worker pools also have to start from a packaged .exe
+
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--batch', metavar='FOLDER', help="recompute the statistics of the coded .csv files in FOLDER, without figures")
+    parser.add_argument('--out', metavar='FOLDER', help="where --batch writes the recomputed files (default: FOLDER/recomputed)")
+    parser.add_argument('--workers', type=int, help="number of processes for --batch (default: one per CPU)")
+    parser.add_argument('--agreement', metavar='FOLDER', help="compare the codings of different coders in FOLDER (writes agreement_*.csv; --out changes the prefix)")
+    parser.add_argument('--synthesize', metavar='FILE', help="write a synthetic recording of the 49-target grid to FILE (.dat or .hdf5)")
+    parser.add_argument('--hz', type=float, default=60., help="sampling rate of --synthesize (default: 60)")
+    parser.add_argument('--duration', type=float, default=SYNTHETIC_DURATION, help="seconds recorded by --synthesize (default: {:g})".format(SYNTHETIC_DURATION))
+    parser.add_argument('--seed', type=int, default=0, help="random seed of --synthesize")
+    parser.add_argument('--benchmark', metavar='BASELINE', nargs='?', const=BENCHMARK_BASELINE, help="time each stage on synthetic recordings and compare with BASELINE (default: {})".format(BENCHMARK_BASELINE))
+    parser.add_argument('--save-baseline', action='store_true', help="store this --benchmark run as the new baseline")
+    parser.add_argument('--profile', action='store_true', help="log stage timings, event latencies and peak memory of each coded file to {} next to its .csv".format(PROFILE_LOG))
+    args = parser.parse_args()
+
+    if args.profile:
+        profiler = Profiler()
+
+    if args.batch:
+        runBatch(args.batch, args.out, args.workers)
+    elif args.agreement:
+        runAgreement(args.agreement, args.out or 'agreement')
+    elif args.synthesize:
+        writeSyntheticRecording(args.synthesize, args.hz, args.duration, args.seed)
+    elif args.benchmark:
+        if runBenchmark(args.benchmark, args.save_baseline):
+            raise SystemExit(1)
+    else:
+        run3()